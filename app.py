@@ -1,22 +1,137 @@
 from __future__ import annotations
 
+import base64
+import binascii
+import cProfile
+import csv
+import hashlib
+import hmac
+import io
 import json
+import os
+import random
+import sqlite3
+import threading
+import time
 import uuid
-from datetime import datetime, timedelta
-from decimal import Decimal, InvalidOperation
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal, DecimalException
+from functools import wraps
 from pathlib import Path
 
-from flask import Flask, flash, jsonify, redirect, render_template, request, url_for
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import click
+from flask import (
+    Flask,
+    before_render_template,
+    flash,
+    g,
+    has_request_context,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    stream_with_context,
+    template_rendered,
+    url_for,
+)
+
+DEFAULT_RESOURCES = [{"id": "main", "name": "Main Clinic", "department": "general"}]
+
+
+def parse_appointment_resources(raw: str) -> list[dict]:
+    try:
+        resources = json.loads(raw.strip() or "[]")
+    except json.JSONDecodeError as error:
+        raise ValueError(
+            f"HMS_APPOINTMENT_RESOURCES is not valid JSON: {error}"
+        ) from None
+    if not isinstance(resources, list) or not all(
+        isinstance(item, dict)
+        and isinstance(item.get("id"), str)
+        and item["id"]
+        and isinstance(item.get("name"), str)
+        for item in resources
+    ):
+        raise ValueError(
+            "HMS_APPOINTMENT_RESOURCES must be a JSON list of objects"
+            ' with string "id" and "name" fields.'
+        )
+    ids = [item["id"] for item in resources]
+    if len(set(ids)) != len(ids):
+        raise ValueError("HMS_APPOINTMENT_RESOURCES ids must be unique.")
+    return resources or DEFAULT_RESOURCES
+
 
 app = Flask(__name__)
 app.secret_key = "change-me"
+app.config.from_mapping(
+    STORAGE_BACKEND=os.environ.get("HMS_STORAGE_BACKEND", "json"),
+    SQLITE_PATH=os.environ.get("HMS_SQLITE_PATH", ""),
+    IMPORT_BATCH_SIZE=1000,
+    APPOINTMENT_BATCH_MAX=1000,
+    AVAILABILITY_MAX_DAYS=92,
+    APPOINTMENT_RESOURCES=parse_appointment_resources(
+        os.environ.get("HMS_APPOINTMENT_RESOURCES", "[]")
+    ),
+    SCHEDULING_HORIZON_DAYS=int(os.environ.get("HMS_SCHEDULING_HORIZON_DAYS", "365")),
+    SLOW_REQUEST_SECONDS=float(os.environ.get("HMS_SLOW_REQUEST_SECONDS", "1.0")),
+    PROFILE_TOKEN=os.environ.get("HMS_PROFILE_TOKEN", ""),
+    PROFILE_SAMPLE_RATE=float(os.environ.get("HMS_PROFILE_SAMPLE_RATE", "0")),
+    PROFILE_DIR=os.environ.get("HMS_PROFILE_DIR", ""),
+    PROFILE_KEEP=200,
+    STREAM_POLL_INTERVAL=1.0,
+    STREAM_HEARTBEAT_INTERVAL=15.0,
+    API_PAGE_SIZE=100,
+    API_MAX_PAGE_SIZE=1000,
+    COUNTER_CHECK_INTERVAL=float(os.environ.get("HMS_COUNTER_CHECK_INTERVAL", "300")),
+    JOURNAL_COMPACT_INTERVAL=float(os.environ.get("HMS_COMPACT_INTERVAL", "30")),
+    JOURNAL_COMPACT_MAX_BYTES=int(os.environ.get("HMS_COMPACT_MAX_BYTES", "8388608")),
+    JOURNAL_COMPACT_MAX_RECORDS=int(os.environ.get("HMS_COMPACT_MAX_RECORDS", "10000")),
+)
 
 BASE_DIR = Path(__file__).resolve().parent
-DATA_DIR = BASE_DIR / "data"
+DATA_DIR = Path(os.environ.get("HMS_DATA_DIR", BASE_DIR / "data"))
 PATIENTS_FILE = DATA_DIR / "patients.json"
 APPOINTMENTS_FILE = DATA_DIR / "appointments.json"
 BILLS_FILE = DATA_DIR / "bills.json"
 
+EXPORT_FIELDS = {
+    "patients": ["id", "name", "age", "gender", "contact", "created_at"],
+    "appointments": [
+        "id",
+        "patient_id",
+        "patient_name",
+        "date",
+        "time",
+        "duration",
+        "resource",
+        "reason",
+        "status",
+        "created_at",
+    ],
+    "bills": [
+        "id",
+        "patient_id",
+        "patient_name",
+        "description",
+        "amount",
+        "status",
+        "created_at",
+    ],
+}
+EXPORT_CHUNK_ROWS = 500
+NO_SLOT_ERROR = "No free appointment slot within the scheduling horizon."
+
 APPOINTMENT_SLOTS = [
     "09:00",
     "09:30",
@@ -44,54 +159,973 @@ def ensure_data_files() -> None:
             path.write_text("[]", encoding="utf-8")
 
 
-def load_data(path: Path) -> list[dict]:
+def parse_date(value: str) -> datetime.date | None:
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        return None
 
 
-def save_data(path: Path, data: list[dict]) -> None:
-    path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+SLOT_MINUTES = 30
+MAX_APPOINTMENT_MINUTES = SLOT_MINUTES * len(APPOINTMENT_SLOTS)
+SLOT_BITS = {slot: 1 << index for index, slot in enumerate(APPOINTMENT_SLOTS)}
+FULL_DAY_MASK = (1 << len(APPOINTMENT_SLOTS)) - 1
 
 
-def find_patient(patients: list[dict], patient_id: str) -> dict | None:
-    return next((p for p in patients if p["id"] == patient_id), None)
+def longest_free_run(mask: int) -> int:
+    free = ~mask & FULL_DAY_MASK
+    length = 0
+    while free:
+        free &= free >> 1
+        length += 1
+    return length
 
 
-def parse_date(value: str) -> datetime.date | None:
+def free_run_starts(mask: int, length: int) -> int:
+    free = ~mask & FULL_DAY_MASK
+    starts = free
+    for shift in range(1, length):
+        starts &= free >> shift
+    return starts
+
+
+class DayRuns:
+    # Days stored as merged, sorted [start, end] ordinal runs, so a search can
+    # jump over a whole stretch of them with one bisect.
+    def __init__(self) -> None:
+        self.starts: list[int] = []
+        self.ends: list[int] = []
+
+    def skip(self, day: int) -> int:
+        index = bisect_right(self.starts, day) - 1
+        if index >= 0 and self.ends[index] >= day:
+            return self.ends[index] + 1
+        return day
+
+    def add(self, day: int) -> None:
+        index = bisect_right(self.starts, day)
+        if index and self.ends[index - 1] >= day:
+            return
+        joins_left = index and self.ends[index - 1] == day - 1
+        joins_right = index < len(self.starts) and self.starts[index] == day + 1
+        if joins_left and joins_right:
+            self.ends[index - 1] = self.ends[index]
+            del self.starts[index], self.ends[index]
+        elif joins_left:
+            self.ends[index - 1] = day
+        elif joins_right:
+            self.starts[index] = day
+        else:
+            self.starts.insert(index, day)
+            self.ends.insert(index, day)
+
+    def remove(self, day: int) -> None:
+        index = bisect_right(self.starts, day) - 1
+        if index < 0 or self.ends[index] < day:
+            return
+        start, end = self.starts[index], self.ends[index]
+        del self.starts[index], self.ends[index]
+        if day < end:
+            self.starts.insert(index, day + 1)
+            self.ends.insert(index, end)
+        if start < day:
+            self.starts.insert(index, start)
+            self.ends.insert(index, day - 1)
+
+
+class SlotIndex:
+    def __init__(self) -> None:
+        self.masks: dict[int, int] = {}
+        # blocked[k] holds the days without k contiguous free slots, so a
+        # booking of any length skips unusable stretches in one step.
+        self.blocked = [DayRuns() for _ in range(len(APPOINTMENT_SLOTS) + 1)]
+
+    def book(self, day: int, mask: int) -> None:
+        self._update(day, self.masks.get(day, 0) | mask)
+
+    def release(self, day: int, mask: int) -> None:
+        self._update(day, self.masks.get(day, 0) & ~mask)
+
+    def next_open_day(self, day: int, length: int = 1) -> int:
+        return self.blocked[length].skip(day)
+
+    def free_starts(self, day: int, length: int = 1) -> int:
+        return free_run_starts(self.masks.get(day, 0), length)
+
+    def first_free_slot(self, day: int, length: int = 1) -> str | None:
+        starts = self.free_starts(day, length)
+        if not starts:
+            return None
+        return APPOINTMENT_SLOTS[(starts & -starts).bit_length() - 1]
+
+    def _update(self, day: int, mask: int) -> None:
+        before = longest_free_run(self.masks.get(day, 0))
+        after = longest_free_run(mask)
+        if mask:
+            self.masks[day] = mask
+        else:
+            self.masks.pop(day, None)
+        for length in range(after + 1, before + 1):
+            self.blocked[length].add(day)
+        for length in range(before + 1, after + 1):
+            self.blocked[length].remove(day)
+
+
+class ResourceSlots:
+    # One SlotIndex per provider or room, so a search only ever looks at the
+    # calendars of the resources it may book.
+    def __init__(self) -> None:
+        self.calendars: dict[str, SlotIndex] = {}
+
+    def calendar(self, resource: str) -> SlotIndex:
+        calendar = self.calendars.get(resource)
+        if calendar is None:
+            calendar = self.calendars.setdefault(resource, SlotIndex())
+        return calendar
+
+    def book(self, resource: str, day: int, mask: int) -> None:
+        self.calendar(resource).book(day, mask)
+
+    def release(self, resource: str, day: int, mask: int) -> None:
+        self.calendar(resource).release(day, mask)
+
+    def free_slots(self, day: int, length: int, resources: list[str]) -> list[str]:
+        starts = 0
+        for resource in resources:
+            starts |= self.calendar(resource).free_starts(day, length)
+        return [slot for slot in APPOINTMENT_SLOTS if starts & SLOT_BITS[slot]]
+
+
+def appointment_resources() -> list[dict]:
+    return app.config["APPOINTMENT_RESOURCES"]
+
+
+def eligible_resources(params) -> tuple[list[str], str | None]:
+    resource = str(params.get("resource", "")).strip()
+    department = str(params.get("department", "")).strip().lower()
+    resources = appointment_resources()
+    if resource:
+        if not any(item["id"] == resource for item in resources):
+            return [], "Unknown resource."
+        return [resource], None
+    if department:
+        matched = [
+            item["id"]
+            for item in resources
+            if str(item.get("department", "")).lower() == department
+        ]
+        if not matched:
+            return [], "No resources for that department."
+        return matched, None
+    return [item["id"] for item in resources], None
+
+
+def appointment_span(record: dict) -> tuple[str, int, int] | None:
+    resource = str(record.get("resource") or appointment_resources()[0]["id"])
+    scheduled = parse_date(str(record.get("date", "")))
+    if not scheduled or record.get("time") not in SLOT_BITS:
+        return None
     try:
-        return datetime.strptime(value, "%Y-%m-%d").date()
-    except ValueError:
+        length = int(record.get("duration", SLOT_MINUTES)) // SLOT_MINUTES
+    except (TypeError, ValueError):
+        return None
+    start = APPOINTMENT_SLOTS.index(record["time"])
+    if not 0 < length <= len(APPOINTMENT_SLOTS) - start:
         return None
+    return resource, scheduled.toordinal(), ((1 << length) - 1) << start
+
+
+MAX_AMOUNT_CENTS = 10**12
+
+
+def parse_cents(value: str) -> int | None:
+    try:
+        amount = Decimal(value)
+    except DecimalException:
+        return None
+    if not amount.is_finite():
+        return None
+    # Past the range check anyway; stop before scaling, which overflows the
+    # decimal context (or builds a huge int) for exponents like 1e999999.
+    if amount.adjusted() > len(str(MAX_AMOUNT_CENTS)):
+        return -(MAX_AMOUNT_CENTS + 1) if amount < 0 else MAX_AMOUNT_CENTS + 1
+    return int((amount * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def format_cents(cents: int) -> str:
+    return f"{Decimal(cents).scaleb(-2):.2f}"
+
+
+def bill_cents(record: dict) -> int:
+    cents = record.get("amount_cents")
+    if not isinstance(cents, int):
+        cents = parse_cents(str(record.get("amount", "0"))) or 0
+    # Out-of-range amounts in stored data count as zero rather than breaking
+    # the ledger columns for every later load.
+    return cents if abs(cents) <= MAX_AMOUNT_CENTS else 0
+
+
+class BillLedger:
+    # Parallel arrays indexed like Collection.records, so billing aggregates
+    # scan machine integers instead of re-parsing every bill dict.
+    def __init__(self) -> None:
+        self.cents = array("q")
+        self.days = array("i")
+        self.unpaid = array("b")
+        self.patients = array("i")
+        self.patient_ids: list[str] = []
+        self.patient_numbers: dict[str, int] = {}
+
+    def patient_number(self, patient_id: str) -> int:
+        number = self.patient_numbers.get(patient_id)
+        if number is None:
+            number = self.patient_numbers[patient_id] = len(self.patient_ids)
+            self.patient_ids.append(patient_id)
+        return number
+
+    def set(self, position: int, record: dict) -> None:
+        created = parse_date(str(record.get("created_at", ""))[:10])
+        row = (
+            bill_cents(record),
+            created.toordinal() if created else 0,
+            record.get("status") == "unpaid",
+            self.patient_number(str(record.get("patient_id", ""))),
+        )
+        columns = (self.cents, self.days, self.unpaid, self.patients)
+        if position == len(self.cents):
+            for column, value in zip(columns, row):
+                column.append(value)
+        else:
+            for column, value in zip(columns, row):
+                column[position] = value
+
+    def outstanding(self) -> dict[str, int]:
+        totals: dict[int, int] = {}
+        for patient, cents, unpaid in zip(self.patients, self.cents, self.unpaid):
+            if unpaid:
+                totals[patient] = totals.get(patient, 0) + cents
+        return {self.patient_ids[patient]: cents for patient, cents in totals.items()}
+
+    def revenue_by_day(self, start: int, end: int) -> dict[int, tuple[int, int]]:
+        totals: dict[int, tuple[int, int]] = {}
+        for day, cents in zip(self.days, self.cents):
+            if start <= day <= end:
+                total, count = totals.get(day, (0, 0))
+                totals[day] = (total + cents, count + 1)
+        return totals
+
+
+@dataclass
+class Collection:
+    path: Path
+    records: list[dict] = field(default_factory=list)
+    positions: dict[str, int] = field(default_factory=dict)
+    changes: list[str] = field(default_factory=list)
+    slots: ResourceSlots = field(default_factory=ResourceSlots)
+    ledger: BillLedger = field(default_factory=BillLedger)
+    unpaid_count: int = 0
+    unpaid_cents: int = 0
+    lock: threading.RLock = field(default_factory=threading.RLock)
+    compact_lock: threading.Lock = field(default_factory=threading.Lock)
+    stamp: tuple | None = None
+    version: int = 0
+    write_depth: int = 0
+    row_seq: int = 0
+    log_offset: int = 0
+    log_records: int = 0
+    log_bytes: int = 0
+
+
+_collections: dict[Path, Collection] = {}
+_collections_lock = threading.Lock()
+_compactor: threading.Thread | None = None
+_counter_checker: threading.Thread | None = None
+_sqlite_local = threading.local()
+_sqlite_ready: set[Path] = set()
+_sqlite_ready_lock = threading.Lock()
+_changed = threading.Condition()
+_change_generation = 0
+compaction_stats: dict[str, dict[str, float]] = {}
+
+
+def journal_path(path: Path) -> Path:
+    return path.with_suffix(".log")
+
+
+def compacting_journal_path(path: Path) -> Path:
+    return path.with_suffix(".compacting.log")
+
+
+def journaled() -> bool:
+    return app.config["STORAGE_BACKEND"] == "journal"
+
+
+def sqlite_backed() -> bool:
+    return app.config["STORAGE_BACKEND"] == "sqlite"
+
+
+def sqlite_path() -> Path:
+    return Path(app.config["SQLITE_PATH"] or DATA_DIR / "hospital.db")
+
+
+def init_sqlite(connection: sqlite3.Connection) -> None:
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS collection_versions ("
+        "name TEXT PRIMARY KEY, "
+        "version INTEGER NOT NULL DEFAULT 0)"
+    )
+    for path in (PATIENTS_FILE, APPOINTMENTS_FILE, BILLS_FILE):
+        table = path.stem
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "id TEXT NOT NULL UNIQUE, "
+            "patient_id TEXT, "
+            "date TEXT, "
+            "status TEXT, "
+            "created_at TEXT, "
+            "data TEXT NOT NULL)"
+        )
+        connection.execute(
+            "INSERT OR IGNORE INTO collection_versions (name) VALUES (?)", (table,)
+        )
+
+
+def sqlite_connection() -> sqlite3.Connection:
+    path = sqlite_path()
+    if getattr(_sqlite_local, "path", None) != path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # The schema setup takes the write lock, so run it once per process
+        # rather than on every new request thread.
+        with _sqlite_ready_lock:
+            if path not in _sqlite_ready:
+                init_sqlite(connection)
+                _sqlite_ready.add(path)
+        _sqlite_local.connection = connection
+        _sqlite_local.path = path
+    return _sqlite_local.connection
+
+
+def sqlite_row(record: dict) -> tuple:
+    return (
+        record["id"],
+        record.get("patient_id"),
+        record.get("date"),
+        record.get("status"),
+        record.get("created_at"),
+        json.dumps(record, separators=(",", ":")),
+    )
+
+
+def sqlite_write(path: Path, records: list[dict]) -> None:
+    connection = sqlite_connection()
+    table = path.stem
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.executemany(
+            f"INSERT OR REPLACE INTO {table} "
+            "(id, patient_id, date, status, created_at, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [sqlite_row(record) for record in records],
+        )
+        connection.execute(
+            "UPDATE collection_versions SET version = version + 1 WHERE name = ?",
+            (table,),
+        )
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+def replay_sqlite(collection: Collection) -> None:
+    rows = sqlite_connection().execute(
+        f"SELECT seq, data FROM {collection.path.stem} WHERE seq > ? ORDER BY seq",
+        (collection.row_seq,),
+    )
+    for seq, data in rows:
+        count_parsed(len(data))
+        apply_record(collection, json.loads(data))
+        collection.row_seq = seq
+
+
+def file_stamp(path: Path) -> tuple[int, int, int] | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def storage_stamp(path: Path) -> tuple:
+    if sqlite_backed():
+        return (
+            sqlite_connection()
+            .execute(
+                "SELECT version FROM collection_versions WHERE name = ?",
+                (path.stem,),
+            )
+            .fetchone()
+        )
+    if not journaled():
+        return (file_stamp(path),)
+    return (
+        file_stamp(path),
+        file_stamp(compacting_journal_path(path)),
+        file_stamp(journal_path(path)),
+    )
+
+
+def read_snapshot(path: Path) -> list[dict]:
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return []
+    count_parsed(len(data))
+    try:
+        return json.loads(data)
+    except json.JSONDecodeError:
+        return []
+
+
+def count_bill(collection: Collection, record: dict, sign: int) -> None:
+    if record.get("status") == "unpaid":
+        collection.unpaid_count += sign
+        collection.unpaid_cents += sign * bill_cents(record)
+
+
+def index_record(collection: Collection, previous: dict | None, record: dict) -> None:
+    if collection.path == BILLS_FILE:
+        collection.ledger.set(collection.positions[record["id"]], record)
+        if previous:
+            count_bill(collection, previous, -1)
+        count_bill(collection, record, 1)
+    if collection.path == APPOINTMENTS_FILE:
+        if previous and (span := appointment_span(previous)):
+            collection.slots.release(*span)
+        if span := appointment_span(record):
+            collection.slots.book(*span)
+
+
+def apply_record(collection: Collection, record: dict) -> None:
+    position = collection.positions.get(record["id"])
+    if position is None:
+        collection.positions[record["id"]] = len(collection.records)
+        collection.records.append(record)
+        index_record(collection, None, record)
+    else:
+        previous = collection.records[position]
+        if previous == record:
+            return
+        collection.records[position] = record
+        index_record(collection, previous, record)
+    collection.changes.append(record["id"])
+
+
+def bump_version(collection: Collection) -> None:
+    global _change_generation
+    collection.version += 1
+    with _changed:
+        _change_generation += 1
+        _changed.notify_all()
+
+
+def wait_for_change(generation: int, timeout: float) -> int:
+    with _changed:
+        _changed.wait_for(lambda: _change_generation != generation, timeout)
+        return _change_generation
+
+
+def replay_journal(collection: Collection, log_path: Path, offset: int = 0) -> int:
+    try:
+        with log_path.open("rb") as log:
+            log.seek(offset)
+            for line in log:
+                # A line without its newline is still being written (or was torn
+                # by a crash); it is picked up or truncated by the next append.
+                if not line.endswith(b"\n"):
+                    break
+                apply_record(collection, json.loads(line))
+                count_parsed(len(line))
+                offset += len(line)
+                collection.log_records += 1
+    except FileNotFoundError:
+        pass
+    return offset
+
+
+def reload_collection(collection: Collection) -> None:
+    # Rebuild into a fresh Collection and swap the results in at the end:
+    # load_data hands out .records without holding the lock, so a reader must
+    # never see a list that is still being filled.
+    path = collection.path
+    fresh = Collection(path)
+    if sqlite_backed():
+        replay_sqlite(fresh)
+    else:
+        for record in read_snapshot(path):
+            apply_record(fresh, record)
+    if journaled():
+        # A leftover .compacting.log means a compaction was interrupted; its
+        # entries may already be in the snapshot, which replay tolerates.
+        fresh.log_bytes = replay_journal(fresh, compacting_journal_path(path))
+        fresh.log_offset = replay_journal(fresh, journal_path(path))
+        fresh.log_bytes += fresh.log_offset
+    collection.positions = fresh.positions
+    collection.changes = fresh.changes
+    collection.slots = fresh.slots
+    collection.ledger = fresh.ledger
+    collection.unpaid_count = fresh.unpaid_count
+    collection.unpaid_cents = fresh.unpaid_cents
+    collection.log_records = fresh.log_records
+    collection.log_bytes = fresh.log_bytes
+    collection.log_offset = fresh.log_offset
+    collection.row_seq = fresh.row_seq
+    collection.records = fresh.records
+
+
+def refresh_collection(collection: Collection) -> None:
+    # Timed here rather than in load_data: most reads reach storage through
+    # get_collection or write_lock without passing through load_data.
+    started = time.perf_counter()
+    if sync_collection(collection):
+        elapsed = time.perf_counter() - started
+        observe(function_latency, "load_data", elapsed)
+        add_request_time("load_data", collection.path.stem, elapsed)
+
+
+def sync_collection(collection: Collection) -> bool:
+    stamp = storage_stamp(collection.path)
+    previous = collection.stamp
+    if stamp == previous:
+        return False
+    if sqlite_backed() and previous is not None:
+        replay_sqlite(collection)
+        collection.stamp = stamp
+        bump_version(collection)
+        return True
+    log_grew = (
+        journaled()
+        and previous is not None
+        and stamp[:-1] == previous[:-1]
+        and stamp[-1] is not None
+        and (
+            previous[-1] is None
+            or (stamp[-1][0] == previous[-1][0] and stamp[-1][2] >= previous[-1][2])
+        )
+    )
+    if log_grew:
+        offset = replay_journal(
+            collection, journal_path(collection.path), collection.log_offset
+        )
+        collection.log_bytes += offset - collection.log_offset
+        collection.log_offset = offset
+    else:
+        reload_collection(collection)
+    collection.stamp = stamp
+    bump_version(collection)
+    return True
+
+
+def get_collection(path: Path) -> Collection:
+    with _collections_lock:
+        collection = _collections.get(path)
+        if collection is None:
+            collection = _collections[path] = Collection(path)
+        start_compactor()
+        start_counter_checker()
+    with collection.lock:
+        refresh_collection(collection)
+    return collection
+
+
+@contextmanager
+def file_lock(lock_path: Path, blocking: bool = True) -> Iterator[bool]:
+    # Without fcntl (Windows) only threads of this process are serialized.
+    with lock_path.open("a") as handle:
+        if fcntl is None:
+            yield True
+            return
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+@contextmanager
+def write_lock(path: Path) -> Iterator[Collection]:
+    collection = get_collection(path)
+    with collection.lock:
+        if collection.write_depth:
+            held = nullcontext()
+        else:
+            held = file_lock(path.with_suffix(".lock"))
+        with held:
+            collection.write_depth += 1
+            try:
+                refresh_collection(collection)
+                yield collection
+            except BaseException:
+                # Drop anything applied in memory but not persisted.
+                collection.stamp = None
+                raise
+            finally:
+                collection.write_depth -= 1
+
+
+@contextmanager
+def compaction_lock(path: Path, blocking: bool = True) -> Iterator[bool]:
+    collection = get_collection(path)
+    if not collection.compact_lock.acquire(blocking=blocking):
+        yield False
+        return
+    try:
+        with file_lock(path.with_suffix(".compact.lock"), blocking) as acquired:
+            yield acquired
+    finally:
+        collection.compact_lock.release()
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+
+_metrics_lock = threading.Lock()
+request_latency: dict[tuple[str, str], Histogram] = {}
+response_sizes: dict[tuple[str, str], Histogram] = {}
+request_statuses: dict[tuple[str, str, int], int] = {}
+function_latency: dict[str, Histogram] = {}
+
+
+def observe(
+    histograms: dict, key, value: float, buckets: tuple[float, ...] = LATENCY_BUCKETS
+) -> None:
+    with _metrics_lock:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+
+def request_stats() -> dict | None:
+    return g.get("request_stats") if has_request_context() else None
+
+
+def count_parsed(size: int) -> None:
+    if (stats := request_stats()) is not None:
+        stats["bytes_parsed"] += size
+
+
+def add_request_time(name: str, detail: str, elapsed: float) -> None:
+    if (stats := request_stats()) is not None:
+        timings = stats["timings"].setdefault(name, {})
+        timings[detail] = timings.get(detail, 0.0) + elapsed
+
+
+def timed(name: str) -> Callable:
+    def decorate(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                observe(function_latency, name, elapsed)
+                detail = args[0].stem if args and isinstance(args[0], Path) else "total"
+                add_request_time(name, detail, elapsed)
+
+        return wrapper
+
+    return decorate
+
+
+def load_data(path: Path) -> list[dict]:
+    # The returned list is shared with the cache and must be treated as read-only.
+    return get_collection(path).records
+
+
+def write_snapshot(path: Path, data: list[dict]) -> None:
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with tmp_path.open("w", encoding="utf-8") as handle:
+        handle.write(json.dumps(data, indent=2))
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+
+
+def compact_collection(path: Path) -> dict[str, float] | None:
+    collection = get_collection(path)
+    log_path = journal_path(path)
+    rotated_path = compacting_journal_path(path)
+    with compaction_lock(path, blocking=False) as acquired:
+        if not acquired:
+            return None
+        started = time.perf_counter()
+        with write_lock(path):
+            if not collection.log_records and not rotated_path.exists():
+                return None
+            if not rotated_path.exists():
+                os.replace(log_path, rotated_path)
+            elif log_path.exists():
+                with rotated_path.open("ab") as rotated, log_path.open("rb") as log:
+                    rotated.write(log.read())
+                log_path.unlink()
+            records = list(collection.records)
+            collection.log_offset = 0
+            collection.log_records = 0
+            collection.log_bytes = 0
+            collection.stamp = storage_stamp(path)
+        # New appends land in a fresh log while the snapshot is rewritten.
+        old_bytes = rotated_path.stat().st_size
+        if path.exists():
+            old_bytes += path.stat().st_size
+        write_snapshot(path, records)
+        rotated_path.unlink()
+        snapshot_stamp = storage_stamp(path)[:2]
+        with collection.lock:
+            # A failed write in the meantime resets the stamp to force a reload.
+            if collection.stamp is not None:
+                collection.stamp = snapshot_stamp + collection.stamp[-1:]
+        duration = time.perf_counter() - started
+        reclaimed = max(old_bytes - snapshot_stamp[0][2], 0)
+    stats = compaction_stats.setdefault(
+        path.stem,
+        {
+            "runs": 0,
+            "last_duration_seconds": 0.0,
+            "total_duration_seconds": 0.0,
+            "last_bytes_reclaimed": 0,
+            "total_bytes_reclaimed": 0,
+        },
+    )
+    stats["runs"] += 1
+    stats["last_duration_seconds"] = duration
+    stats["total_duration_seconds"] += duration
+    stats["last_bytes_reclaimed"] = reclaimed
+    stats["total_bytes_reclaimed"] += reclaimed
+    app.logger.info(
+        "Compacted %s: %d records in %.3fs, %d bytes reclaimed",
+        path.name,
+        len(records),
+        duration,
+        reclaimed,
+    )
+    return stats
+
+
+def needs_compaction(collection: Collection) -> bool:
+    return (
+        collection.log_bytes >= app.config["JOURNAL_COMPACT_MAX_BYTES"]
+        or collection.log_records >= app.config["JOURNAL_COMPACT_MAX_RECORDS"]
+    )
+
+
+def run_compactor() -> None:
+    while True:
+        time.sleep(app.config["JOURNAL_COMPACT_INTERVAL"])
+        with _collections_lock:
+            collections = list(_collections.values())
+        for collection in collections:
+            if not needs_compaction(collection):
+                continue
+            try:
+                compact_collection(collection.path)
+            except Exception:
+                # Keep the thread alive; the next pass retries the compaction.
+                app.logger.exception("Compaction of %s failed", collection.path)
+
+
+def start_compactor() -> None:
+    global _compactor
+    if (
+        _compactor is not None
+        or not journaled()
+        or app.config["JOURNAL_COMPACT_INTERVAL"] <= 0
+    ):
+        return
+    _compactor = threading.Thread(
+        target=run_compactor, name="journal-compactor", daemon=True
+    )
+    _compactor.start()
+
+
+@timed("append_records")
+def append_records(path: Path, records: list[dict]) -> None:
+    with write_lock(path) as collection:
+        if sqlite_backed():
+            sqlite_write(path, records)
+            refresh_collection(collection)
+            return
+        if not journaled():
+            # Readers in other processes do not take the file lock, so the
+            # snapshot is replaced atomically rather than rewritten in place.
+            write_snapshot(path, [*collection.records, *records])
+            for record in records:
+                apply_record(collection, record)
+            collection.stamp = storage_stamp(path)
+            bump_version(collection)
+            return
+        lines = b"".join(
+            (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+            for record in records
+        )
+        with journal_path(path).open("ab") as log:
+            if log.tell() > collection.log_offset:
+                log.truncate(collection.log_offset)
+            log.write(lines)
+        refresh_collection(collection)
+
+
+def append_record(path: Path, record: dict) -> None:
+    append_records(path, [record])
+
+
+def read_json_collection(path: Path) -> list[dict]:
+    collection = Collection(path)
+    for record in read_snapshot(path):
+        apply_record(collection, record)
+    replay_journal(collection, compacting_journal_path(path))
+    replay_journal(collection, journal_path(path))
+    return collection.records
+
+
+@app.cli.command("migrate-sqlite")
+def migrate_sqlite_command() -> None:
+    """Import the JSON data files (and any journal logs) into SQLite."""
+    for path in (PATIENTS_FILE, APPOINTMENTS_FILE, BILLS_FILE):
+        records = read_json_collection(path)
+        sqlite_write(path, records)
+        click.echo(f"Imported {len(records)} records from {path.name}")
+    click.echo(f"Database: {sqlite_path()}")
+
 
+def get_record(path: Path, record_id: str) -> dict | None:
+    collection = get_collection(path)
+    with collection.lock:
+        position = collection.positions.get(record_id)
+        return None if position is None else collection.records[position]
 
+
+def changes_since(path: Path, since: int) -> tuple[list[dict], int, bool]:
+    collection = get_collection(path)
+    with collection.lock:
+        seq = len(collection.changes)
+        # A sequence from before a reload or compaction is not comparable.
+        reset = since > seq
+        if reset:
+            since = 0
+        changed = dict.fromkeys(collection.changes[since:])
+        records = [collection.records[collection.positions[id_]] for id_ in changed]
+    return records, seq, reset
+
+
+def find_patient(patient_id: str) -> dict | None:
+    return get_record(PATIENTS_FILE, patient_id)
+
+
+@timed("find_next_available_slot")
 def find_next_available_slot(
-    appointments: list[dict], preferred_date: str
-) -> tuple[str, str] | None:
-    date = parse_date(preferred_date)
-    if not date:
+    slots: ResourceSlots, preferred_date: str, length: int, resources: list[str]
+) -> tuple[str, str, str] | None:
+    preferred = parse_date(preferred_date)
+    if not preferred:
+        return None
+    start = preferred.toordinal()
+    horizon_end = min(
+        start + app.config["SCHEDULING_HORIZON_DAYS"], date.max.toordinal() + 1
+    )
+    best = None
+    days = 0
+    for resource in resources:
+        calendar = slots.calendar(resource)
+        day = calendar.next_open_day(start, length)
+        days += min(day + 1, horizon_end) - start
+        if day >= horizon_end:
+            continue
+        candidate = (day, calendar.first_free_slot(day, length), resource)
+        if best is None or candidate[:2] < best[:2]:
+            best = candidate
+    if (stats := request_stats()) is not None:
+        stats["scheduler_days"] += days
+    if not best:
         return None
+    day, scheduled_time, resource = best
+    return date.fromordinal(day).isoformat(), scheduled_time, resource
+
+
+def overview_counts() -> dict[str, int | str]:
+    bills = get_collection(BILLS_FILE)
+    with bills.lock:
+        return {
+            "patients": len(load_data(PATIENTS_FILE)),
+            "appointments": len(load_data(APPOINTMENTS_FILE)),
+            "bills": len(bills.records),
+            "unpaid": bills.unpaid_count,
+            "unpaid_amount": format_cents(bills.unpaid_cents),
+        }
+
+
+def check_overview_counters(repair: bool = True) -> list[str]:
+    bills = get_collection(BILLS_FILE)
+    with bills.lock:
+        unpaid = [b for b in bills.records if b.get("status") == "unpaid"]
+        expected = {
+            "unpaid_count": len(unpaid),
+            "unpaid_cents": sum(bill_cents(b) for b in unpaid),
+        }
+        problems = []
+        for name, value in expected.items():
+            actual = getattr(bills, name)
+            if actual != value:
+                problems.append(f"{name}: maintained {actual}, recomputed {value}")
+                if repair:
+                    setattr(bills, name, value)
+    return problems
+
+
+def run_counter_checker() -> None:
+    # Runs inside the serving process, where the maintained counters live.
     while True:
-        booked = {a["time"] for a in appointments if a["date"] == date.isoformat()}
-        for slot in APPOINTMENT_SLOTS:
-            if slot not in booked:
-                return date.isoformat(), slot
-        date += timedelta(days=1)
+        time.sleep(app.config["COUNTER_CHECK_INTERVAL"])
+        try:
+            for problem in check_overview_counters():
+                app.logger.warning("Repaired overview counter %s", problem)
+        except Exception:
+            app.logger.exception("Overview counter check failed")
+
+
+def start_counter_checker() -> None:
+    global _counter_checker
+    if _counter_checker is not None or app.config["COUNTER_CHECK_INTERVAL"] <= 0:
+        return
+    _counter_checker = threading.Thread(
+        target=run_counter_checker, name="counter-checker", daemon=True
+    )
+    _counter_checker.start()
 
 
 @app.route("/")
 def index():
-    patients = load_data(PATIENTS_FILE)
-    appointments = load_data(APPOINTMENTS_FILE)
-    bills = load_data(BILLS_FILE)
-    totals = {
-        "patients": len(patients),
-        "appointments": len(appointments),
-        "bills": len(bills),
-        "unpaid": len([b for b in bills if b["status"] == "unpaid"]),
-    }
-    return render_template("index.html", totals=totals)
+    return render_template("index.html", totals=overview_counts())
 
 
 def build_patient(payload: dict) -> tuple[dict | None, str | None]:
@@ -116,27 +1150,54 @@ def build_patient(payload: dict) -> tuple[dict | None, str | None]:
     return new_patient, None
 
 
-def build_appointment(
-    patient_records: list[dict], appointment_records: list[dict], payload: dict
-) -> tuple[dict | None, str | None]:
+def parse_duration(value: str) -> int | None:
+    try:
+        duration = int(value)
+    except ValueError:
+        return None
+    if duration % SLOT_MINUTES or not 0 < duration <= MAX_APPOINTMENT_MINUTES:
+        return None
+    return duration
+
+
+def build_appointment(payload: dict) -> tuple[dict | None, str | None]:
     patient_id = str(payload.get("patient_id", "")).strip()
     preferred_date = str(payload.get("preferred_date", "")).strip()
     reason = str(payload.get("reason", "")).strip()
+    duration_raw = str(payload.get("duration", "")).strip()
     if not patient_id or not preferred_date:
         return None, "Patient ID and preferred date are required."
-    patient = find_patient(patient_records, patient_id)
+    patient = find_patient(patient_id)
     if not patient:
         return None, "Patient not found."
-    slot = find_next_available_slot(appointment_records, preferred_date)
-    if not slot:
+    if not parse_date(preferred_date):
         return None, "Preferred date must be in YYYY-MM-DD format."
-    scheduled_date, scheduled_time = slot
+    duration = parse_duration(duration_raw) if duration_raw else SLOT_MINUTES
+    if not duration:
+        return None, (
+            f"Duration must be a multiple of {SLOT_MINUTES} minutes, "
+            f"up to {MAX_APPOINTMENT_MINUTES} minutes."
+        )
+    resources, error = eligible_resources(payload)
+    if error:
+        return None, error
+    slot = find_next_available_slot(
+        get_collection(APPOINTMENTS_FILE).slots,
+        preferred_date,
+        duration // SLOT_MINUTES,
+        resources,
+    )
+    if not slot:
+        return None, NO_SLOT_ERROR
+    scheduled_date, scheduled_time, resource = slot
     new_appointment = {
         "id": f"A-{uuid.uuid4().hex[:8]}",
         "patient_id": patient_id,
         "patient_name": patient["name"],
         "date": scheduled_date,
         "time": scheduled_time,
+        "duration": duration,
+        "resource": resource,
         "reason": reason or "general",
         "status": "scheduled",
         "created_at": datetime.now().isoformat(timespec="seconds"),
@@ -144,33 +1205,144 @@ def build_appointment(
     return new_appointment, None
 
 
-def build_bill(
-    patient_records: list[dict], payload: dict
-) -> tuple[dict | None, str | None]:
+def build_bill(payload: dict) -> tuple[dict | None, str | None]:
     patient_id = str(payload.get("patient_id", "")).strip()
     description = str(payload.get("description", "")).strip()
     amount_raw = str(payload.get("amount", "")).strip()
     if not patient_id or not amount_raw:
         return None, "Patient ID and amount are required."
-    patient = find_patient(patient_records, patient_id)
+    patient = find_patient(patient_id)
     if not patient:
         return None, "Patient not found."
-    try:
-        amount = Decimal(amount_raw)
-    except InvalidOperation:
+    amount_cents = parse_cents(amount_raw)
+    if amount_cents is None:
         return None, "Amount must be a valid number."
+    if abs(amount_cents) > MAX_AMOUNT_CENTS:
+        return None, "Amount out of range."
     new_bill = {
         "id": f"B-{uuid.uuid4().hex[:8]}",
         "patient_id": patient_id,
         "patient_name": patient["name"],
         "description": description or "services",
-        "amount": f"{amount:.2f}",
+        "amount": format_cents(amount_cents),
+        "amount_cents": amount_cents,
         "status": "unpaid",
         "created_at": datetime.now().isoformat(timespec="seconds"),
     }
     return new_bill, None
 
 
+def book_appointment(payload: dict) -> tuple[dict | None, str | None]:
+    with write_lock(APPOINTMENTS_FILE):
+        new_appointment, error = build_appointment(payload)
+        if new_appointment:
+            append_record(APPOINTMENTS_FILE, new_appointment)
+    return new_appointment, error
+
+
+def encode_cursor(position: int, record_id: str) -> str:
+    raw = f"{position}:{record_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(records: list[dict], cursor: str) -> int | None:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position_raw, record_id = raw.decode("utf-8").split(":", 1)
+        position = int(position_raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if not 0 < position <= len(records) or records[position - 1]["id"] != record_id:
+        return None
+    return position
+
+
+def collection_etag(*paths: Path) -> str:
+    key = repr((request.full_path, [storage_stamp(path) for path in paths]))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def conditional_response(paths: tuple[Path, ...], build: Callable[[], object]):
+    # The ETag comes from file stamps / SQLite versions only, so a matching
+    # If-None-Match is answered without loading or serializing any records.
+    etag = collection_etag(*paths)
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def list_response(path: Path):
+    return conditional_response((path,), lambda: collection_listing(path))
+
+
+def collection_listing(path: Path):
+    if "since" in request.args:
+        try:
+            since = int(request.args["since"])
+        except ValueError:
+            since = -1
+        if since < 0:
+            return jsonify({"error": "Since must be a non-negative number."}), 400
+        records, seq, reset = changes_since(path, since)
+        return jsonify({"items": records, "seq": seq, "reset": reset})
+    records = load_data(path)
+    if "limit" not in request.args and "cursor" not in request.args:
+        return jsonify(records)
+    max_limit = app.config["API_MAX_PAGE_SIZE"]
+    try:
+        limit = int(request.args.get("limit", app.config["API_PAGE_SIZE"]))
+    except ValueError:
+        limit = 0
+    if not 0 < limit <= max_limit:
+        return jsonify({"error": f"Limit must be between 1 and {max_limit}."}), 400
+    start = 0
+    if cursor := request.args.get("cursor"):
+        start = decode_cursor(records, cursor)
+        if start is None:
+            return jsonify({"error": "Invalid cursor."}), 400
+    page = records[start : start + limit]
+    next_cursor = None
+    next_url = None
+    if start + len(page) < len(records):
+        next_cursor = encode_cursor(start + len(page), page[-1]["id"])
+        next_url = url_for(request.endpoint, limit=limit, cursor=next_cursor)
+    response = jsonify({"items": page, "next_cursor": next_cursor, "next": next_url})
+    if next_url:
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
+
+
+def hold_slot(collection: Collection, appointment: dict) -> None:
+    # Hold the slot so later entries in the same batch see it as taken.
+    collection.slots.book(*appointment_span(appointment))
+
+
+def book_appointments(payloads: list[dict]) -> tuple[list[dict], list[dict]]:
+    created = []
+    errors = []
+    with write_lock(APPOINTMENTS_FILE) as collection:
+        for index, payload in enumerate(payloads):
+            new_appointment, error = build_appointment(payload)
+            if error:
+                errors.append({"index": index, "error": error})
+                continue
+            hold_slot(collection, new_appointment)
+            created.append(new_appointment)
+        if errors:
+            for new_appointment in created:
+                collection.slots.release(*appointment_span(new_appointment))
+            return [], errors
+        if created:
+            append_records(APPOINTMENTS_FILE, created)
+    return created, []
+
+
 @app.route("/patients", methods=["GET", "POST"])
 def patients():
     ensure_data_files()
@@ -180,8 +1352,7 @@ def patients():
         if error:
             flash(error, "error")
             return redirect(url_for("patients"))
-        patient_records.append(new_patient)
-        save_data(PATIENTS_FILE, patient_records)
+        append_record(PATIENTS_FILE, new_patient)
         flash(f"Patient created: {new_patient['id']}", "success")
         return redirect(url_for("patients"))
     return render_template("patients.html", patients=patient_records)
@@ -192,17 +1363,16 @@ def appointments():
     ensure_data_files()
     patient_records = load_data(PATIENTS_FILE)
     appointment_records = load_data(APPOINTMENTS_FILE)
+    resources = appointment_resources()
+    resource_names = {item["id"]: item["name"] for item in resources}
     if request.method == "POST":
-        new_appointment, error = build_appointment(
-            patient_records, appointment_records, request.form
-        )
+        new_appointment, error = book_appointment(request.form)
         if error:
             flash(error, "error")
             return redirect(url_for("appointments"))
-        appointment_records.append(new_appointment)
-        save_data(APPOINTMENTS_FILE, appointment_records)
         flash(
-            f"Appointment booked for {new_appointment['date']} at {new_appointment['time']}.",
+            f"Appointment booked for {new_appointment['date']} at {new_appointment['time']}"
+            f" ({resource_names[new_appointment['resource']]}).",
             "success",
         )
         return redirect(url_for("appointments"))
@@ -211,6 +1381,8 @@ def appointments():
         appointments=appointment_records,
         patients=patient_records,
         slots=APPOINTMENT_SLOTS,
+        resources=resources,
+        resource_names=resource_names,
     )
 
 
@@ -220,12 +1392,11 @@ def billing():
     patient_records = load_data(PATIENTS_FILE)
     bill_records = load_data(BILLS_FILE)
     if request.method == "POST":
-        new_bill, error = build_bill(patient_records, request.form)
+        new_bill, error = build_bill(request.form)
         if error:
             flash(error, "error")
             return redirect(url_for("billing"))
-        bill_records.append(new_bill)
-        save_data(BILLS_FILE, bill_records)
+        append_record(BILLS_FILE, new_bill)
         flash(f"Bill generated: {new_bill['id']}", "success")
         return redirect(url_for("billing"))
     return render_template("billing.html", bills=bill_records, patients=patient_records)
@@ -234,66 +1405,673 @@ def billing():
 @app.get("/api/overview")
 def api_overview():
     ensure_data_files()
-    patients = load_data(PATIENTS_FILE)
-    appointments = load_data(APPOINTMENTS_FILE)
-    bills = load_data(BILLS_FILE)
-    return jsonify(
-        {
-            "patients": len(patients),
-            "appointments": len(appointments),
-            "bills": len(bills),
-            "unpaid": len([b for b in bills if b["status"] == "unpaid"]),
+    return conditional_response(
+        (PATIENTS_FILE, APPOINTMENTS_FILE, BILLS_FILE), overview_response
+    )
+
+
+def overview_response():
+    return jsonify(overview_counts())
+
+
+@app.before_request
+def start_request_timer() -> None:
+    g.request_started = time.perf_counter()
+    g.request_stats = {"timings": {}, "bytes_parsed": 0, "scheduler_days": 0}
+
+
+@app.after_request
+def record_request_metrics(response):
+    # Streamed responses are timed up to the first byte; their size is unknown.
+    key = (request.endpoint or "unmatched", request.method)
+    observe(request_latency, key, time.perf_counter() - g.request_started)
+    if not response.is_streamed:
+        observe(response_sizes, key, response.content_length or 0, SIZE_BUCKETS)
+    status_key = (*key, response.status_code)
+    with _metrics_lock:
+        request_statuses[status_key] = request_statuses.get(status_key, 0) + 1
+    return response
+
+
+@app.after_request
+def log_slow_request(response):
+    threshold = app.config["SLOW_REQUEST_SECONDS"]
+    duration = time.perf_counter() - g.request_started
+    if threshold <= 0 or duration < threshold:
+        return response
+    stats = g.request_stats
+    entry = {
+        "event": "slow_request",
+        "endpoint": request.endpoint or "unmatched",
+        "method": request.method,
+        "path": request.full_path.rstrip("?"),
+        "status": response.status_code,
+        "duration_ms": round(duration * 1000, 3),
+        "timings_ms": {
+            name: {detail: round(value * 1000, 3) for detail, value in parts.items()}
+            for name, parts in stats["timings"].items()
+        },
+        "bytes_parsed": stats["bytes_parsed"],
+        "scheduler_days": stats["scheduler_days"],
+        "records": {
+            path.stem: len(collection.records)
+            for path, collection in list(_collections.items())
+        },
+    }
+    app.logger.warning(json.dumps(entry))
+    return response
+
+
+def profile_requested() -> bool:
+    token = app.config["PROFILE_TOKEN"]
+    # Header only: a query parameter would leak the token into access logs,
+    # the slow-request log and profile metadata, which all record the path.
+    supplied = request.headers.get("X-Profile")
+    # compare_digest only accepts ASCII str, so compare the encoded bytes.
+    if token and supplied and hmac.compare_digest(supplied.encode(), token.encode()):
+        return True
+    return random.random() < app.config["PROFILE_SAMPLE_RATE"]
+
+
+def profile_dir() -> Path:
+    return Path(app.config["PROFILE_DIR"] or BASE_DIR / "profiles")
+
+
+def data_sizes() -> dict[str, dict[str, int | None]]:
+    sizes = {}
+    for path in (PATIENTS_FILE, APPOINTMENTS_FILE, BILLS_FILE):
+        collection = _collections.get(path)
+        files = [path, journal_path(path)]
+        if sqlite_backed():
+            files = [sqlite_path()]
+        sizes[path.stem] = {
+            "records": len(collection.records) if collection else None,
+            "bytes": sum(item.stat().st_size for item in files if item.exists()),
         }
+    return sizes
+
+
+# Only one profiler can be active per process (Python 3.12+ raises ValueError
+# for a second one), so overlapping requests skip profiling instead.
+_profile_lock = threading.Lock()
+
+
+@app.before_request
+def start_profiler() -> None:
+    if not profile_requested() or not _profile_lock.acquire(blocking=False):
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiling tool (a debugger, coverage) is already active.
+        _profile_lock.release()
+        return
+    g.profiler = profiler
+
+
+def stop_profiling() -> cProfile.Profile | None:
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        _profile_lock.release()
+    return profiler
+
+
+@app.after_request
+def save_profile(response):
+    profiler = stop_profiling()
+    if profiler is None:
+        return response
+    duration = time.perf_counter() - g.request_started
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    endpoint = request.endpoint or "unmatched"
+    name = f"{datetime.now():%Y%m%dT%H%M%S%f}-{endpoint}-{uuid.uuid4().hex[:6]}"
+    profiler.dump_stats(directory / f"{name}.prof")
+    metadata = {
+        "endpoint": endpoint,
+        "method": request.method,
+        "path": request.full_path.rstrip("?"),
+        "status": response.status_code,
+        "duration_seconds": round(duration, 6),
+        "data": data_sizes(),
+    }
+    (directory / f"{name}.json").write_text(json.dumps(metadata), encoding="utf-8")
+    for stale in sorted(directory.glob("*.prof"))[: -app.config["PROFILE_KEEP"]]:
+        stale.unlink(missing_ok=True)
+        stale.with_suffix(".json").unlink(missing_ok=True)
+    response.headers["X-Profile-Id"] = name
+    return response
+
+
+@app.teardown_request
+def stop_profiler(error) -> None:
+    stop_profiling()
+
+
+@before_render_template.connect_via(app)
+def start_render_timer(sender, template, context, **extra) -> None:
+    g.render_started = time.perf_counter()
+
+
+@template_rendered.connect_via(app)
+def record_render_time(sender, template, context, **extra) -> None:
+    if "render_started" in g:
+        elapsed = time.perf_counter() - g.render_started
+        observe(function_latency, "render_template", elapsed)
+        add_request_time("render_template", template.name, elapsed)
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def metric_labels(**labels) -> str:
+    pairs = ",".join(
+        f'{name}="{escape_label(value)}"' for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def histogram_lines(name: str, histogram: Histogram, labels: dict) -> list[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{metric_labels(**labels, le=bound)} {cumulative}")
+    lines.append(f"{name}_sum{metric_labels(**labels)} {histogram.total}")
+    lines.append(f"{name}_count{metric_labels(**labels)} {cumulative}")
+    return lines
+
+
+def metric_header(name: str, kind: str, help_text: str) -> list[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+@app.get("/metrics")
+def metrics():
+    lines = []
+    with _metrics_lock:
+        lines += metric_header(
+            "hms_request_duration_seconds", "histogram", "Request latency."
+        )
+        for (endpoint, method), histogram in sorted(request_latency.items()):
+            lines += histogram_lines(
+                "hms_request_duration_seconds",
+                histogram,
+                {"endpoint": endpoint, "method": method},
+            )
+        lines += metric_header(
+            "hms_response_size_bytes", "histogram", "Response body size."
+        )
+        for (endpoint, method), histogram in sorted(response_sizes.items()):
+            lines += histogram_lines(
+                "hms_response_size_bytes",
+                histogram,
+                {"endpoint": endpoint, "method": method},
+            )
+        lines += metric_header(
+            "hms_requests_total", "counter", "Requests by endpoint and status."
+        )
+        for (endpoint, method, status), count in sorted(request_statuses.items()):
+            labels = metric_labels(endpoint=endpoint, method=method, status=status)
+            lines.append(f"hms_requests_total{labels} {count}")
+        lines += metric_header(
+            "hms_function_duration_seconds",
+            "histogram",
+            "Time spent in storage, scheduling and rendering.",
+        )
+        for function, histogram in sorted(function_latency.items()):
+            lines += histogram_lines(
+                "hms_function_duration_seconds", histogram, {"function": function}
+            )
+    compaction_metrics = (
+        ("runs", "hms_compaction_runs_total", "counter", "Journal compactions."),
+        (
+            "total_duration_seconds",
+            "hms_compaction_duration_seconds_total",
+            "counter",
+            "Time spent compacting journals.",
+        ),
+        (
+            "total_bytes_reclaimed",
+            "hms_compaction_bytes_reclaimed_total",
+            "counter",
+            "Bytes reclaimed by compaction.",
+        ),
+        (
+            "last_duration_seconds",
+            "hms_compaction_last_duration_seconds",
+            "gauge",
+            "Duration of the latest compaction.",
+        ),
+        (
+            "last_bytes_reclaimed",
+            "hms_compaction_last_bytes_reclaimed",
+            "gauge",
+            "Bytes reclaimed by the latest compaction.",
+        ),
+    )
+    for key, name, kind, help_text in compaction_metrics:
+        lines += metric_header(name, kind, help_text)
+        for collection, stats in sorted(compaction_stats.items()):
+            lines.append(f"{name}{metric_labels(collection=collection)} {stats[key]}")
+    return app.response_class(
+        "\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4"
+    )
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+@app.get("/api/stream")
+def api_stream():
+    ensure_data_files()
+    watched = {}
+    for path in (PATIENTS_FILE, APPOINTMENTS_FILE, BILLS_FILE):
+        if path.stem not in request.args:
+            continue
+        try:
+            since = int(request.args[path.stem])
+        except ValueError:
+            since = -1
+        if since < 0:
+            return (
+                jsonify({"error": f"{path.stem} must be a non-negative sequence."}),
+                400,
+            )
+        watched[path] = since
+    with_overview = "overview" in request.args
+    poll_interval = app.config["STREAM_POLL_INTERVAL"]
+    heartbeat_interval = app.config["STREAM_HEARTBEAT_INTERVAL"]
+
+    def generate() -> Iterator[str]:
+        generation = -1
+        overview = None
+        last_sent = time.monotonic()
+        while True:
+            for path, since in watched.items():
+                records, seq, reset = changes_since(path, since)
+                if records or reset:
+                    watched[path] = seq
+                    payload = {
+                        "collection": path.stem,
+                        "items": records,
+                        "seq": seq,
+                        "reset": reset,
+                    }
+                    last_sent = time.monotonic()
+                    yield sse_event("records", payload)
+            if with_overview and (counts := overview_counts()) != overview:
+                overview = counts
+                last_sent = time.monotonic()
+                yield sse_event("overview", counts)
+            if time.monotonic() - last_sent >= heartbeat_interval:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            # Local commits wake the stream at once; the timeout picks up
+            # writes made by other worker processes.
+            generation = wait_for_change(generation, poll_interval)
+
+    return app.response_class(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
 @app.route("/api/patients", methods=["GET", "POST"])
 def api_patients():
     ensure_data_files()
-    patient_records = load_data(PATIENTS_FILE)
     if request.method == "POST":
         payload = request.get_json(silent=True) or {}
         new_patient, error = build_patient(payload)
         if error:
             return jsonify({"error": error}), 400
-        patient_records.append(new_patient)
-        save_data(PATIENTS_FILE, patient_records)
+        append_record(PATIENTS_FILE, new_patient)
         return jsonify(new_patient), 201
-    return jsonify(patient_records)
+    return list_response(PATIENTS_FILE)
+
+
+@app.get("/api/patients/<patient_id>")
+def api_patient(patient_id: str):
+    ensure_data_files()
+    return conditional_response((PATIENTS_FILE,), lambda: patient_response(patient_id))
+
+
+def patient_response(patient_id: str):
+    patient = find_patient(patient_id)
+    if not patient:
+        return jsonify({"error": "Patient not found."}), 404
+    return jsonify(patient)
 
 
 @app.route("/api/appointments", methods=["GET", "POST"])
 def api_appointments():
     ensure_data_files()
-    patient_records = load_data(PATIENTS_FILE)
-    appointment_records = load_data(APPOINTMENTS_FILE)
     if request.method == "POST":
         payload = request.get_json(silent=True) or {}
-        new_appointment, error = build_appointment(
-            patient_records, appointment_records, payload
-        )
+        new_appointment, error = book_appointment(payload)
         if error:
-            return jsonify({"error": error}), 400
-        appointment_records.append(new_appointment)
-        save_data(APPOINTMENTS_FILE, appointment_records)
+            return jsonify({"error": error}), 409 if error == NO_SLOT_ERROR else 400
         return jsonify(new_appointment), 201
-    return jsonify(appointment_records)
+    return list_response(APPOINTMENTS_FILE)
+
+
+@app.post("/api/appointments/batch")
+def api_appointments_batch():
+    ensure_data_files()
+    payloads = request.get_json(silent=True)
+    if not isinstance(payloads, list) or not all(
+        isinstance(payload, dict) for payload in payloads
+    ):
+        return jsonify({"error": "Expected a JSON list of appointment requests."}), 400
+    if len(payloads) > app.config["APPOINTMENT_BATCH_MAX"]:
+        batch_max = app.config["APPOINTMENT_BATCH_MAX"]
+        return jsonify({"error": f"At most {batch_max} appointments per batch."}), 400
+    created, errors = book_appointments(payloads)
+    if errors:
+        conflict = all(item["error"] == NO_SLOT_ERROR for item in errors)
+        return jsonify({"errors": errors}), 409 if conflict else 400
+    return jsonify(created), 201
+
+
+@app.get("/api/resources")
+def api_resources():
+    return jsonify(appointment_resources())
+
+
+@app.get("/api/availability")
+def api_availability():
+    ensure_data_files()
+    start = parse_date(request.args.get("from", "").strip())
+    end = parse_date(request.args.get("to", "").strip())
+    if not start or not end:
+        return jsonify({"error": "from and to must be in YYYY-MM-DD format."}), 400
+    max_days = app.config["AVAILABILITY_MAX_DAYS"]
+    if not 0 <= (end - start).days < max_days:
+        return (
+            jsonify({"error": f"The range must cover 1 to {max_days} days."}),
+            400,
+        )
+    duration_raw = request.args.get("duration", "").strip()
+    duration = parse_duration(duration_raw) if duration_raw else SLOT_MINUTES
+    if not duration:
+        return (
+            jsonify({"error": f"Duration must be a multiple of {SLOT_MINUTES}."}),
+            400,
+        )
+    resources, error = eligible_resources(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    return conditional_response(
+        (APPOINTMENTS_FILE,),
+        lambda: availability_response(start, end, duration // SLOT_MINUTES, resources),
+    )
+
+
+def availability_response(start: date, end: date, length: int, resources: list[str]):
+    appointments = get_collection(APPOINTMENTS_FILE)
+    with appointments.lock:
+        days = [
+            {
+                "date": date.fromordinal(day).isoformat(),
+                "free": appointments.slots.free_slots(day, length, resources),
+            }
+            for day in range(start.toordinal(), end.toordinal() + 1)
+        ]
+    return jsonify({"from": start.isoformat(), "to": end.isoformat(), "days": days})
 
 
 @app.route("/api/bills", methods=["GET", "POST"])
 def api_bills():
     ensure_data_files()
-    patient_records = load_data(PATIENTS_FILE)
-    bill_records = load_data(BILLS_FILE)
     if request.method == "POST":
         payload = request.get_json(silent=True) or {}
-        new_bill, error = build_bill(patient_records, payload)
+        new_bill, error = build_bill(payload)
         if error:
             return jsonify({"error": error}), 400
-        bill_records.append(new_bill)
-        save_data(BILLS_FILE, bill_records)
+        append_record(BILLS_FILE, new_bill)
         return jsonify(new_bill), 201
-    return jsonify(bill_records)
+    return list_response(BILLS_FILE)
+
+
+@app.get("/api/bills/outstanding")
+def api_bills_outstanding():
+    ensure_data_files()
+    return conditional_response((BILLS_FILE,), outstanding_response)
+
+
+def outstanding_response():
+    bills = get_collection(BILLS_FILE)
+    with bills.lock:
+        totals = bills.ledger.outstanding()
+    patients = [
+        {
+            "patient_id": patient_id,
+            "outstanding": format_cents(cents),
+            "outstanding_cents": cents,
+        }
+        for patient_id, cents in sorted(totals.items(), key=lambda item: -item[1])
+        if cents
+    ]
+    total = sum(totals.values())
+    return jsonify(
+        {
+            "patients": patients,
+            "total": format_cents(total),
+            "total_cents": total,
+        }
+    )
+
+
+@app.get("/api/bills/revenue")
+def api_bills_revenue():
+    ensure_data_files()
+    period = request.args.get("period", "day").strip()
+    if period not in ("day", "month"):
+        return jsonify({"error": "period must be day or month."}), 400
+    for name in ("from", "to"):
+        value = request.args.get(name, "").strip()
+        if value and not parse_date(value):
+            return jsonify({"error": f"{name} must be in YYYY-MM-DD format."}), 400
+    start = parse_date(request.args.get("from", "").strip())
+    end = parse_date(request.args.get("to", "").strip())
+    return conditional_response(
+        (BILLS_FILE,),
+        lambda: revenue_response(
+            period,
+            start.toordinal() if start else 1,
+            end.toordinal() if end else date.max.toordinal(),
+        ),
+    )
+
+
+def revenue_response(period: str, start: int, end: int):
+    bills = get_collection(BILLS_FILE)
+    with bills.lock:
+        by_day = bills.ledger.revenue_by_day(start, end)
+    totals: dict[str, tuple[int, int]] = {}
+    for day in sorted(by_day):
+        key = date.fromordinal(day).isoformat()
+        if period == "month":
+            key = key[:7]
+        total, count = totals.get(key, (0, 0))
+        cents, bills_count = by_day[day]
+        totals[key] = (total + cents, count + bills_count)
+    return jsonify(
+        {
+            "period": period,
+            "totals": [
+                {
+                    "period": key,
+                    "amount": format_cents(cents),
+                    "amount_cents": cents,
+                    "bills": count,
+                }
+                for key, (cents, count) in totals.items()
+            ],
+        }
+    )
+
+
+def collection_paths() -> dict[str, Path]:
+    return {
+        "patients": PATIENTS_FILE,
+        "appointments": APPOINTMENTS_FILE,
+        "bills": BILLS_FILE,
+    }
+
+
+def import_builders() -> dict[str, tuple[Path, Callable]]:
+    return {
+        "patients": (PATIENTS_FILE, build_patient),
+        "appointments": (APPOINTMENTS_FILE, build_appointment),
+        "bills": (BILLS_FILE, build_bill),
+    }
+
+
+def import_batch(
+    path: Path, build: Callable, batch: list[tuple[int, dict]]
+) -> tuple[list[dict], int]:
+    results = []
+    created = []
+    with write_lock(path) as collection:
+        for line_number, payload in batch:
+            record, error = build(payload)
+            if error:
+                results.append({"line": line_number, "error": error})
+                continue
+            if path == APPOINTMENTS_FILE:
+                hold_slot(collection, record)
+            created.append(record)
+            results.append({"line": line_number, "id": record["id"]})
+        if created:
+            append_records(path, created)
+    return results, len(created)
+
+
+@app.post("/api/import/<collection_name>")
+def api_import(collection_name: str):
+    ensure_data_files()
+    if collection_name not in import_builders():
+        return jsonify({"error": "Unknown collection."}), 404
+    path, build = import_builders()[collection_name]
+    batch_size = app.config["IMPORT_BATCH_SIZE"]
+
+    def generate() -> Iterator[str]:
+        totals = {"created": 0, "failed": 0}
+        batch = []
+        pending = []
+
+        def flush() -> Iterator[str]:
+            results, created = import_batch(path, build, batch) if batch else ([], 0)
+            totals["created"] += created
+            totals["failed"] += len(results) - created + len(pending)
+            for result in sorted(pending + results, key=lambda item: item["line"]):
+                yield json.dumps(result) + "\n"
+            batch.clear()
+            pending.clear()
+
+        for line_number, line in enumerate(request.stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                payload = json.loads(line)
+            except json.JSONDecodeError:
+                payload = None
+            if not isinstance(payload, dict):
+                pending.append({"line": line_number, "error": "Invalid JSON object."})
+            else:
+                batch.append((line_number, payload))
+            if len(batch) >= batch_size:
+                yield from flush()
+        yield from flush()
+        yield json.dumps(totals) + "\n"
+
+    return app.response_class(
+        stream_with_context(generate()), mimetype="application/x-ndjson"
+    )
+
+
+def export_rows(
+    records: list[dict], collection_name: str, filters: dict
+) -> Iterator[dict]:
+    date_field = "date" if collection_name == "appointments" else "created_at"
+    # Writes append to the cached list or replace entries in place, and a
+    # reload swaps in a new list, so walking a fixed prefix of the list taken
+    # at the start gives a consistent view without copying it.
+    for index in range(len(records)):
+        record = records[index]
+        day = str(record.get(date_field, ""))[:10]
+        if filters["from"] and day < filters["from"]:
+            continue
+        if filters["to"] and day > filters["to"]:
+            continue
+        if filters["status"] and record.get("status") != filters["status"]:
+            continue
+        yield record
+
+
+def export_csv(rows: Iterator[dict], fields: list[str]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fields, extrasaction="ignore")
+    writer.writeheader()
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(rows: Iterator[dict]) -> Iterator[str]:
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(row))
+        if len(chunk) == EXPORT_CHUNK_ROWS:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+@app.get("/api/export/<collection_name>")
+def api_export(collection_name: str):
+    ensure_data_files()
+    path = collection_paths().get(collection_name)
+    if not path:
+        return jsonify({"error": "Unknown collection."}), 404
+    export_format = request.args.get("format", "csv")
+    if export_format not in ("csv", "ndjson"):
+        return jsonify({"error": "Format must be csv or ndjson."}), 400
+    filters = {
+        "from": request.args.get("from", "").strip(),
+        "to": request.args.get("to", "").strip(),
+        "status": request.args.get("status", "").strip(),
+    }
+    for name in ("from", "to"):
+        if filters[name] and not parse_date(filters[name]):
+            return jsonify({"error": f"{name} must be in YYYY-MM-DD format."}), 400
+    rows = export_rows(load_data(path), collection_name, filters)
+    if export_format == "csv":
+        body = export_csv(rows, EXPORT_FIELDS[collection_name])
+        mimetype = "text/csv"
+    else:
+        body = export_ndjson(rows)
+        mimetype = "application/x-ndjson"
+    return app.response_class(
+        body,
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": (
+                f"attachment; filename={collection_name}.{export_format}"
+            )
+        },
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from benchmarks.run import ROOT, print_summary, run
+
+DEFAULT_BASELINE = ROOT / "benchmarks" / "baseline.json"
+
+
+def best_of(runs: list[dict]) -> dict:
+    # Keep, per route, the whole run with the lowest p95, which filters out
+    # one-off stalls from a noisy machine without hiding a consistent slowdown
+    # and keeps each route's percentiles from a single run.
+    best = runs[0]
+    best["meta"]["repeat"] = len(runs)
+    for other in runs[1:]:
+        for scale_name, scale in other["scales"].items():
+            scale_best = best["scales"][scale_name]
+            scale_best["calibration_ms"] = min(
+                scale_best.get("calibration_ms", float("inf")),
+                scale.get("calibration_ms", float("inf")),
+            )
+            routes = scale_best["routes"]
+            for name, route in scale["routes"].items():
+                if name not in routes or route["p95_ms"] < routes[name]["p95_ms"]:
+                    routes[name] = route
+    return best
+
+
+def compare(
+    baseline: dict,
+    current: dict,
+    tolerance: float,
+    alloc_tolerance: float,
+    min_ms: float,
+    min_bytes: int,
+) -> list[str]:
+    # A route regresses when it is both relatively and absolutely worse, so
+    # sub-millisecond jitter on fast routes does not fail the gate.
+    checks = (
+        ("p95_ms", tolerance, min_ms, "ms"),
+        ("alloc_peak_bytes", alloc_tolerance, min_bytes, "B"),
+    )
+    problems = []
+    for scale_name, scale in current["scales"].items():
+        expected = baseline["scales"].get(scale_name)
+        if not expected:
+            continue
+        speed = 1.0
+        if expected.get("calibration_ms") and scale.get("calibration_ms"):
+            speed = scale["calibration_ms"] / expected["calibration_ms"]
+        for name, before in expected["routes"].items():
+            after = scale["routes"].get(name)
+            if after is None:
+                problems.append(f"{scale_name} {name}: missing from this run")
+                continue
+            for metric, allowed, floor, unit in checks:
+                old, new = before.get(metric), after.get(metric)
+                if old is None or new is None:
+                    continue
+                if unit == "ms":
+                    old = round(old * speed, 3)
+                if new - old > floor and new > old * (1 + allowed):
+                    change = (new - old) / old * 100 if old else float("inf")
+                    problems.append(
+                        f"{scale_name} {name}: {metric} {old:g}{unit} -> "
+                        f"{new:g}{unit} (+{change:.0f}%, allowed +{allowed:.0%})"
+                    )
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Rerun the benchmarks and compare them to a stored baseline."
+    )
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--results",
+        type=Path,
+        help="compare an existing results file instead of rerunning",
+    )
+    parser.add_argument("--scales", help="subset of the baseline scales to run")
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        help="runs to take the best p95 from (default: the baseline's repeat)",
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.5, help="allowed p95 growth"
+    )
+    parser.add_argument(
+        "--alloc-tolerance", type=float, default=0.25, help="allowed allocation growth"
+    )
+    parser.add_argument("--min-ms", type=float, default=2.0)
+    parser.add_argument("--min-bytes", type=int, default=65536)
+    parser.add_argument(
+        "--update", action="store_true", help="write this run as the new baseline"
+    )
+    args = parser.parse_args()
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if args.results:
+        current = json.loads(args.results.read_text(encoding="utf-8"))
+    else:
+        meta = baseline["meta"]
+        settings = argparse.Namespace(
+            scales=args.scales or ",".join(baseline["scales"]),
+            backend=meta["backend"],
+            requests=meta["requests"],
+            max_seconds=meta["max_seconds"],
+            alloc_requests=meta["alloc_requests"],
+            seed=meta["seed"],
+        )
+        repeat = args.repeat or meta.get("repeat", 1)
+        current = best_of([run(settings) for _ in range(max(repeat, 1))])
+        print_summary(current)
+    if args.update:
+        args.baseline.write_text(json.dumps(current, indent=2) + "\n", encoding="utf-8")
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    problems = compare(
+        baseline,
+        current,
+        args.tolerance,
+        args.alloc_tolerance,
+        args.min_ms,
+        args.min_bytes,
+    )
+    print(
+        f"\nBaseline {baseline['meta'].get('commit') or 'unknown'}"
+        f" vs {current['meta'].get('commit') or 'unknown'}"
+    )
+    if problems:
+        print(f"{len(problems)} regression(s):")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
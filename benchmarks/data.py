@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+from collections.abc import Iterable, Iterator
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+SLOTS = [f"{hour:02d}:{minute:02d}" for hour in range(9, 17) for minute in (0, 30)]
+DEPARTMENTS = ["general", "pediatrics", "cardiology", "orthopedics", "dermatology"]
+RESOURCES = [
+    {
+        "id": f"{department}-{room}",
+        "name": f"{department.title()} Room {room}",
+        "department": department,
+    }
+    for department in DEPARTMENTS
+    for room in range(1, 5)
+]
+
+FIRST_NAMES = [
+    "Aarav",
+    "Ananya",
+    "Carlos",
+    "Chen",
+    "Fatima",
+    "Grace",
+    "Hiro",
+    "Ines",
+    "James",
+    "Lakshmi",
+    "Mateo",
+    "Noah",
+    "Olga",
+    "Priya",
+    "Sara",
+    "Yusuf",
+]
+LAST_NAMES = [
+    "Batchu",
+    "Garcia",
+    "Ivanova",
+    "Kim",
+    "Mensah",
+    "Nakamura",
+    "Okafor",
+    "Patel",
+    "Rossi",
+    "Smith",
+    "Wang",
+    "Zhou",
+]
+REASONS = ["general", "follow-up", "checkup", "vaccination", "consultation", "x-ray"]
+DESCRIPTIONS = ["services", "consultation", "lab tests", "pharmacy", "imaging"]
+
+
+def parse_scale(value: str) -> int:
+    value = value.strip().lower()
+    if value in SCALES:
+        return SCALES[value]
+    return int(value)
+
+
+def timestamp(rng: random.Random, start: datetime, days: int) -> str:
+    moment = start + timedelta(seconds=rng.randrange(days * 86400))
+    return moment.isoformat(timespec="seconds")
+
+
+def generate_patients(
+    count: int, rng: random.Random, start: datetime
+) -> Iterator[dict]:
+    for number in range(count):
+        yield {
+            "id": f"P-{number:08x}",
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "age": rng.randint(0, 95),
+            "gender": rng.choice(["female", "male", "unspecified"]),
+            "contact": f"555-{rng.randrange(10000):04d}",
+            "created_at": timestamp(rng, start, 730),
+        }
+
+
+def generate_appointments(
+    count: int, patients: list[tuple[str, str]], rng: random.Random, first_day: date
+) -> Iterator[dict]:
+    # Fill each resource's calendar forward from first_day, leaving a share of
+    # slots free so the scheduler has real gaps to search through.
+    day = first_day
+    created = 0
+    while created < count:
+        for resource in RESOURCES:
+            position = 0
+            while position < len(SLOTS) and created < count:
+                length = 2 if rng.random() < 0.2 else 1
+                if position + length > len(SLOTS) or rng.random() < 0.25:
+                    position += 1
+                    continue
+                patient_id, patient_name = rng.choice(patients)
+                yield {
+                    "id": f"A-{created:08x}",
+                    "patient_id": patient_id,
+                    "patient_name": patient_name,
+                    "date": day.isoformat(),
+                    "time": SLOTS[position],
+                    "duration": 30 * length,
+                    "resource": resource["id"],
+                    "reason": rng.choice(REASONS),
+                    "status": "scheduled",
+                    "created_at": f"{day - timedelta(days=7)}T09:00:00",
+                }
+                created += 1
+                position += length
+        day += timedelta(days=1)
+
+
+def generate_bills(
+    count: int, patients: list[tuple[str, str]], rng: random.Random, start: datetime
+) -> Iterator[dict]:
+    for number in range(count):
+        patient_id, patient_name = rng.choice(patients)
+        cents = rng.randrange(500, 500_000)
+        yield {
+            "id": f"B-{number:08x}",
+            "patient_id": patient_id,
+            "patient_name": patient_name,
+            "description": rng.choice(DESCRIPTIONS),
+            "amount": f"{cents // 100}.{cents % 100:02d}",
+            "amount_cents": cents,
+            "status": "unpaid" if rng.random() < 0.7 else "paid",
+            "created_at": timestamp(rng, start, 730),
+        }
+
+
+def write_json_array(path: Path, records: Iterable[dict]) -> int:
+    count = 0
+    with path.open("w", encoding="utf-8") as handle:
+        handle.write("[")
+        for record in records:
+            handle.write(",\n  " if count else "\n  ")
+            handle.write(json.dumps(record))
+            count += 1
+        handle.write("\n]" if count else "]")
+    return count
+
+
+def generate(data_dir: Path, scale: int, seed: int = 1) -> dict[str, int]:
+    """Write patients, appointments and bills with `scale` records each."""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    start = datetime(date.today().year - 2, 1, 1)
+    patients = list(generate_patients(scale, rng, start))
+    counts = {"patients": write_json_array(data_dir / "patients.json", patients)}
+    names = [(patient["id"], patient["name"]) for patient in patients]
+    del patients
+    first_day = date.today() - timedelta(days=30)
+    counts["appointments"] = write_json_array(
+        data_dir / "appointments.json",
+        generate_appointments(scale, names, rng, first_day),
+    )
+    counts["bills"] = write_json_array(
+        data_dir / "bills.json", generate_bills(scale, names, rng, start)
+    )
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate synthetic HMS data.")
+    parser.add_argument(
+        "scale", help="records per collection: 1k, 100k, 1m or a number"
+    )
+    parser.add_argument("data_dir", type=Path)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    counts = generate(args.data_dir, parse_scale(args.scale), args.seed)
+    print(json.dumps(counts))
+
+
+if __name__ == "__main__":
+    main()
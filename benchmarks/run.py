@@ -0,0 +1,377 @@
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from benchmarks.data import RESOURCES, generate, parse_scale
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_OUTPUT = ROOT / "benchmarks" / "results" / "latest.json"
+
+
+@dataclass
+class Scenario:
+    method: str
+    path: str
+    build: Callable[[random.Random], dict]
+    stream: bool = False
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.path}"
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def build_scenarios(hms, rng: random.Random) -> list[Scenario]:
+    patient_ids = list(hms.get_collection(hms.PATIENTS_FILE).positions)
+    patients_seq = len(hms.get_collection(hms.PATIENTS_FILE).changes)
+    today = date.today()
+    window = f"from={today}&to={today + timedelta(days=13)}"
+    etag = hms.app.test_client().get("/api/patients?limit=100").headers.get("ETag")
+
+    def patient_id(rng: random.Random) -> str:
+        return rng.choice(patient_ids)
+
+    def patient_form(rng: random.Random) -> dict:
+        return {"name": "Bench Patient", "age": str(rng.randint(0, 95))}
+
+    def appointment_form(rng: random.Random) -> dict:
+        return {
+            "patient_id": patient_id(rng),
+            "preferred_date": (today + timedelta(days=rng.randrange(60))).isoformat(),
+            "reason": "benchmark",
+        }
+
+    def bill_form(rng: random.Random) -> dict:
+        return {"patient_id": patient_id(rng), "amount": f"{rng.randrange(5, 5000)}.50"}
+
+    def import_body(rng: random.Random) -> str:
+        return "".join(
+            json.dumps({"name": f"Imported {n}", "age": rng.randint(0, 95)}) + "\n"
+            for n in range(100)
+        )
+
+    def get(path: str, label: str | None = None, **extra) -> Scenario:
+        # Labels keep dated or data-dependent paths comparable between runs.
+        return Scenario("GET", label or path, lambda rng: {"path": path}, **extra)
+
+    scenarios = [
+        get("/"),
+        get("/patients"),
+        get("/appointments"),
+        get("/billing"),
+        get("/metrics"),
+        get("/api/overview"),
+        get("/api/stream?overview=1", stream=True),
+        get("/api/patients"),
+        get("/api/patients?limit=100"),
+        Scenario(
+            "GET",
+            "/api/patients?limit=100 (If-None-Match)",
+            lambda rng: {
+                "path": "/api/patients?limit=100",
+                "headers": {"If-None-Match": etag},
+            },
+        ),
+        get(
+            f"/api/patients?since={max(patients_seq - 10, 0)}",
+            "/api/patients?since=<latest-10>",
+        ),
+        Scenario(
+            "GET",
+            "/api/patients/<patient_id>",
+            lambda rng: {"path": f"/api/patients/{patient_id(rng)}"},
+        ),
+        get("/api/appointments"),
+        get("/api/appointments?limit=100"),
+        get("/api/bills"),
+        get("/api/bills?limit=100"),
+        get("/api/resources"),
+        get(f"/api/availability?{window}", "/api/availability?<14 days>"),
+        get(
+            f"/api/availability?{window}&department=cardiology&duration=60",
+            "/api/availability?<14 days>&department=cardiology&duration=60",
+        ),
+        get("/api/bills/outstanding"),
+        get("/api/bills/revenue?period=month"),
+        get("/api/export/patients?format=ndjson"),
+        get(
+            f"/api/export/appointments?format=csv&{window}",
+            "/api/export/appointments?format=csv&<14 days>",
+        ),
+        get("/api/export/bills?format=csv&status=unpaid"),
+        Scenario("POST", "/patients", lambda rng: {"data": patient_form(rng)}),
+        Scenario("POST", "/appointments", lambda rng: {"data": appointment_form(rng)}),
+        Scenario("POST", "/billing", lambda rng: {"data": bill_form(rng)}),
+        Scenario("POST", "/api/patients", lambda rng: {"json": patient_form(rng)}),
+        Scenario(
+            "POST", "/api/appointments", lambda rng: {"json": appointment_form(rng)}
+        ),
+        Scenario(
+            "POST",
+            "/api/appointments/batch",
+            lambda rng: {"json": [appointment_form(rng) for _ in range(10)]},
+        ),
+        Scenario("POST", "/api/bills", lambda rng: {"json": bill_form(rng)}),
+        Scenario(
+            "POST",
+            "/api/import/patients",
+            lambda rng: {
+                "data": import_body(rng),
+                "content_type": "application/x-ndjson",
+            },
+        ),
+    ]
+    return scenarios
+
+
+def send(client, scenario: Scenario, rng: random.Random) -> tuple[int, int]:
+    kwargs = scenario.build(rng)
+    kwargs.setdefault("path", scenario.path)
+    response = client.open(method=scenario.method, **kwargs)
+    if scenario.stream:
+        size = len(next(iter(response.response)))
+    else:
+        size = len(response.get_data())
+    response.close()
+    return response.status_code, size
+
+
+def measure(
+    client,
+    scenario: Scenario,
+    rng: random.Random,
+    requests: int,
+    max_seconds: float,
+    alloc_requests: int,
+) -> dict:
+    send(client, scenario, rng)
+    timings = []
+    sizes = []
+    statuses: dict[str, int] = {}
+    started = time.perf_counter()
+    while len(timings) < requests and (
+        not timings or time.perf_counter() - started < max_seconds
+    ):
+        before = time.perf_counter()
+        status, size = send(client, scenario, rng)
+        timings.append(time.perf_counter() - before)
+        sizes.append(size)
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    elapsed = sum(timings)
+
+    peaks = []
+    tracemalloc.start()
+    for _ in range(alloc_requests):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        send(client, scenario, rng)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    return {
+        "method": scenario.method,
+        "requests": len(timings),
+        "seconds": round(elapsed, 6),
+        "throughput": round(len(timings) / elapsed, 2) if elapsed else None,
+        "mean_ms": round(statistics.fmean(timings) * 1000, 3),
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "max_ms": round(max(timings) * 1000, 3),
+        "response_bytes": round(statistics.fmean(sizes)),
+        "alloc_peak_bytes": int(statistics.median(peaks)) if peaks else None,
+        "status": statuses,
+    }
+
+
+def calibrate() -> float:
+    # A fixed parse/serialise workload timed on this machine, so runs from
+    # different hosts can be put on the same scale before comparing.
+    payload = [
+        {"id": f"P-{n:08x}", "name": "Calibration", "age": n} for n in range(2000)
+    ]
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(5):
+            json.loads(json.dumps(payload))
+        best = min(best, time.perf_counter() - started)
+    return round(best * 1000, 3)
+
+
+def worker(args: argparse.Namespace) -> dict:
+    # Runs in a fresh interpreter per scale, with HMS_* pointing at the
+    # generated data, so every scale starts from a cold app.
+    sys.path.insert(0, str(ROOT))
+    started = time.perf_counter()
+    import app as hms
+
+    result = {
+        "import_seconds": round(time.perf_counter() - started, 6),
+        "calibration_ms": calibrate(),
+    }
+    if hms.app.config["STORAGE_BACKEND"] == "sqlite":
+        started = time.perf_counter()
+        hms.app.test_cli_runner().invoke(args=["migrate-sqlite"])
+        result["migrate_seconds"] = round(time.perf_counter() - started, 6)
+    client = hms.app.test_client()
+    started = time.perf_counter()
+    client.get("/api/overview")
+    result["cold_start_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    rng = random.Random(args.seed)
+    routes = {}
+    for scenario in build_scenarios(hms, rng):
+        routes[scenario.name] = measure(
+            client,
+            scenario,
+            rng,
+            args.requests,
+            args.max_seconds,
+            args.alloc_requests,
+        )
+        print(
+            f"  {scenario.name}: {routes[scenario.name]['p95_ms']} ms p95",
+            file=sys.stderr,
+        )
+    result["routes"] = routes
+    return result
+
+
+def run_scale(args: argparse.Namespace, scale_name: str) -> dict:
+    scale = parse_scale(scale_name)
+    with tempfile.TemporaryDirectory(prefix="hms-bench-") as tmp:
+        data_dir = Path(tmp) / "data"
+        started = time.perf_counter()
+        counts = generate(data_dir, scale, args.seed)
+        generate_seconds = time.perf_counter() - started
+        env = dict(
+            os.environ,
+            HMS_DATA_DIR=str(data_dir),
+            HMS_STORAGE_BACKEND=args.backend,
+            HMS_SQLITE_PATH=str(data_dir / "hospital.db"),
+            HMS_APPOINTMENT_RESOURCES=json.dumps(RESOURCES),
+        )
+        command = [
+            sys.executable,
+            "-m",
+            "benchmarks.run",
+            "--worker",
+            f"--requests={args.requests}",
+            f"--max-seconds={args.max_seconds}",
+            f"--alloc-requests={args.alloc_requests}",
+            f"--seed={args.seed}",
+        ]
+        completed = subprocess.run(
+            command, cwd=ROOT, env=env, stdout=subprocess.PIPE, check=True
+        )
+    result = json.loads(completed.stdout)
+    result["records"] = counts
+    result["generate_seconds"] = round(generate_seconds, 3)
+    return result
+
+
+def git_commit() -> str | None:
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return completed.stdout.strip()
+
+
+def run(args: argparse.Namespace) -> dict:
+    results = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "requests": args.requests,
+            "max_seconds": args.max_seconds,
+            "alloc_requests": args.alloc_requests,
+            "seed": args.seed,
+            "repeat": 1,
+        },
+        "scales": {},
+    }
+    for scale_name in args.scales.split(","):
+        print(f"scale {scale_name} ({args.backend})", file=sys.stderr)
+        results["scales"][scale_name] = run_scale(args, scale_name)
+    return results
+
+
+def print_summary(results: dict) -> None:
+    for scale_name, scale in results["scales"].items():
+        width = max(len(name) for name in scale["routes"])
+        print(f"\n== {scale_name}: {scale['records']} ==")
+        print(
+            f"{'route':<{width}} {'n':>5} {'req/s':>9}"
+            f" {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+        )
+        for name, route in scale["routes"].items():
+            print(
+                f"{name:<{width}} {route['requests']:>5}"
+                f" {route['throughput'] or 0:>9.1f} {route['p50_ms']:>9.2f}"
+                f" {route['p95_ms']:>9.2f} {route['p99_ms']:>9.2f}"
+            )
+
+
+def add_run_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--scales", default="1k", help="comma separated, e.g. 1k,100k,1m"
+    )
+    parser.add_argument(
+        "--backend", default="json", choices=["json", "journal", "sqlite"]
+    )
+    parser.add_argument("--requests", type=int, default=200, help="per route")
+    parser.add_argument(
+        "--max-seconds", type=float, default=5.0, help="time budget per route"
+    )
+    parser.add_argument("--alloc-requests", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark every app.py route.")
+    add_run_arguments(parser)
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        json.dump(worker(args), sys.stdout)
+        return
+    results = run(args)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    print_summary(results)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
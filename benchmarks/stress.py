@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PATIENT = {"id": "P-stress01", "name": "Stress Patient", "age": 40}
+RESOURCES = [
+    {"id": "room-1", "name": "Room 1", "department": "general"},
+    {"id": "room-2", "name": "Room 2", "department": "general"},
+]
+
+
+def worker(args: argparse.Namespace) -> dict:
+    # One process: several threads all booking from the same preferred date,
+    # so every booking competes for the same earliest free slot.
+    sys.path.insert(0, str(ROOT))
+    import app as hms
+
+    created = []
+    errors = []
+    lock = threading.Lock()
+
+    def book() -> None:
+        client = hms.app.test_client()
+        for _ in range(args.bookings):
+            response = client.post(
+                "/api/appointments",
+                json={"patient_id": PATIENT["id"], "preferred_date": args.date},
+            )
+            with lock:
+                if response.status_code == 201:
+                    created.append(response.get_json()["id"])
+                else:
+                    errors.append(response.status_code)
+
+    threads = [threading.Thread(target=book) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {"created": created, "errors": errors}
+
+
+def stored_appointments() -> list[dict]:
+    sys.path.insert(0, str(ROOT))
+    import app as hms
+
+    return list(hms.load_data(hms.APPOINTMENTS_FILE))
+
+
+def run_backend(args: argparse.Namespace, backend: str) -> list[str]:
+    with tempfile.TemporaryDirectory(prefix="hms-stress-") as tmp:
+        data_dir = Path(tmp)
+        (data_dir / "patients.json").write_text(json.dumps([PATIENT]))
+        (data_dir / "appointments.json").write_text("[]")
+        (data_dir / "bills.json").write_text("[]")
+        env = dict(
+            os.environ,
+            HMS_DATA_DIR=str(data_dir),
+            HMS_STORAGE_BACKEND=backend,
+            HMS_SQLITE_PATH=str(data_dir / "hospital.db"),
+            HMS_APPOINTMENT_RESOURCES=json.dumps(RESOURCES),
+            HMS_COMPACT_INTERVAL="0.2",
+            HMS_COMPACT_MAX_RECORDS="50",
+            HMS_SLOW_REQUEST_SECONDS="0",
+        )
+        command = [sys.executable, "-m", "benchmarks.stress"]
+        if backend == "sqlite":
+            subprocess.run(
+                [sys.executable, "-m", "flask", "--app", "app", "migrate-sqlite"],
+                cwd=ROOT,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                check=True,
+            )
+        workers = [
+            subprocess.Popen(
+                [
+                    *command,
+                    "--worker",
+                    f"--threads={args.threads}",
+                    f"--bookings={args.bookings}",
+                    f"--date={args.date}",
+                ],
+                cwd=ROOT,
+                env=env,
+                stdout=subprocess.PIPE,
+            )
+            for _ in range(args.processes)
+        ]
+        results = [json.loads(process.communicate()[0]) for process in workers]
+        stored = json.loads(
+            subprocess.run(
+                [*command, "--dump"],
+                cwd=ROOT,
+                env=env,
+                stdout=subprocess.PIPE,
+                check=True,
+            ).stdout
+        )
+
+    problems = []
+    created = [record_id for result in results for record_id in result["created"]]
+    errors = [status for result in results for status in result["errors"]]
+    expected = args.processes * args.threads * args.bookings
+    if errors:
+        problems.append(f"{len(errors)} bookings failed: {Counter(errors)}")
+    if len(created) + len(errors) != expected:
+        problems.append(f"{len(created) + len(errors)} responses for {expected}")
+    stored_ids = [record["id"] for record in stored]
+    if sorted(stored_ids) != sorted(created):
+        problems.append(
+            f"{len(created)} bookings acknowledged, {len(stored_ids)} stored"
+        )
+    slots = Counter(
+        (record.get("resource"), record["date"], record["time"]) for record in stored
+    )
+    duplicates = {slot: count for slot, count in slots.items() if count > 1}
+    if duplicates:
+        problems.append(f"{len(duplicates)} slots double-booked, e.g. {duplicates}")
+    print(
+        f"{backend}: {len(created)}/{expected} booked, {len(slots)} unique slots,"
+        f" {len(stored_ids)} stored"
+    )
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Book appointments from many processes and threads at once"
+        " and check that no slot is handed out twice."
+    )
+    parser.add_argument("--backends", default="json,journal,sqlite")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--bookings", type=int, default=32, help="per thread")
+    parser.add_argument("--date", default="2030-01-01")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--dump", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        json.dump(worker(args), sys.stdout)
+        return
+    if args.dump:
+        json.dump(stored_appointments(), sys.stdout)
+        return
+    failed = False
+    for backend in args.backends.split(","):
+        for problem in run_backend(args, backend):
+            print(f"  {problem}")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -28,15 +28,35 @@
     return data;
   };
 
+  const etagCache = new Map();
+
   const getJSON = async (url) => {
-    const response = await fetch(url);
+    const key = new URL(url, window.location.href).pathname;
+    const cached = etagCache.get(key);
+    const response = await fetch(url, {
+      cache: "no-store",
+      headers: cached ? { "If-None-Match": cached.etag } : {},
+    });
+    if (response.status === 304 && cached) {
+      return cached.data;
+    }
     if (!response.ok) {
       throw new Error("Request failed");
     }
-    return response.json();
+    const data = await response.json();
+    const etag = response.headers.get("ETag");
+    if (etag) {
+      etagCache.set(key, { etag, data });
+    }
+    return data;
   };
 
-  const wireForm = (formSelector, endpoint, onSuccess) => {
+  const wireForm = (
+    formSelector,
+    endpoint,
+    onSuccess,
+    successText = () => "Saved successfully."
+  ) => {
     const form = document.querySelector(formSelector);
     if (!form) {
       return;
@@ -47,7 +67,7 @@
       try {
         const created = await postJSON(endpoint, payload);
         form.reset();
-        showMessage("Saved successfully.", "success");
+        showMessage(successText(created), "success");
         if (onSuccess) {
           onSuccess(created);
         }
@@ -57,96 +77,122 @@
     });
   };
 
-  const renderPatients = (patients) => {
-    const body = document.getElementById("patients-body");
-    if (!body) {
-      return;
-    }
-    body.innerHTML = "";
-    if (!patients.length) {
-      body.innerHTML =
-        '<tr><td colspan="6" class="muted">No patients yet.</td></tr>';
-      return;
-    }
-    patients.forEach((patient) => {
-      const row = document.createElement("tr");
-      row.innerHTML = `
+  const createTableSync = (bodyId, endpoint, emptyText, renderCells) => {
+    const rows = new Map();
+    let seq = 0;
+
+    const render = (records, replace) => {
+      const body = document.getElementById(bodyId);
+      if (!body) {
+        return;
+      }
+      if (replace) {
+        body.innerHTML = "";
+        rows.clear();
+      }
+      records.forEach((record) => {
+        let row = rows.get(record.id);
+        if (!row) {
+          row = document.createElement("tr");
+          row.dataset.id = record.id;
+          rows.set(record.id, row);
+          body.appendChild(row);
+        }
+        row.innerHTML = renderCells(record);
+      });
+      body.querySelectorAll("tr:not([data-id])").forEach((row) => row.remove());
+      if (!rows.size) {
+        const columns = body.closest("table").querySelectorAll("thead th").length;
+        body.innerHTML = `<tr><td colspan="${columns}" class="muted">${emptyText}</td></tr>`;
+      }
+    };
+
+    const apply = (data) => {
+      render(data.items, seq === 0 || data.reset);
+      seq = data.seq;
+    };
+
+    return {
+      apply,
+      seq: () => seq,
+      sync: async () => apply(await getJSON(`${endpoint}?since=${seq}`)),
+    };
+  };
+
+  const patientsTable = createTableSync(
+    "patients-body",
+    "/api/patients",
+    "No patients yet.",
+    (patient) => `
         <td>${patient.id}</td>
         <td>${patient.name}</td>
         <td>${patient.age}</td>
         <td>${patient.gender}</td>
         <td>${patient.contact || ""}</td>
         <td>${patient.created_at}</td>
-      `;
-      body.appendChild(row);
-    });
+      `
+  );
+
+  const resourceName = (id) => {
+    const options = Array.from(
+      document.querySelectorAll('select[name="resource"] option')
+    ).filter((option) => option.value);
+    // Appointments booked before resources existed belong to the first one.
+    const option = id
+      ? options.find((item) => item.value === id)
+      : options[0];
+    return option ? option.textContent : id || "";
   };
 
-  const renderAppointments = (appointments) => {
-    const body = document.getElementById("appointments-body");
-    if (!body) {
-      return;
-    }
-    body.innerHTML = "";
-    if (!appointments.length) {
-      body.innerHTML =
-        '<tr><td colspan="6" class="muted">No appointments yet.</td></tr>';
-      return;
-    }
-    appointments.forEach((appointment) => {
-      const row = document.createElement("tr");
-      row.innerHTML = `
+  const appointmentsTable = createTableSync(
+    "appointments-body",
+    "/api/appointments",
+    "No appointments yet.",
+    (appointment) => `
         <td>${appointment.id}</td>
         <td>${appointment.patient_name} (${appointment.patient_id})</td>
         <td>${appointment.date}</td>
         <td>${appointment.time}</td>
+        <td>${resourceName(appointment.resource)}</td>
+        <td>${appointment.duration || 30} min</td>
         <td>${appointment.reason}</td>
         <td>${appointment.status}</td>
-      `;
-      body.appendChild(row);
-    });
-  };
+      `
+  );
 
-  const renderBills = (bills) => {
-    const body = document.getElementById("billing-body");
-    if (!body) {
-      return;
-    }
-    body.innerHTML = "";
-    if (!bills.length) {
-      body.innerHTML =
-        '<tr><td colspan="6" class="muted">No billing records yet.</td></tr>';
-      return;
-    }
-    bills.forEach((bill) => {
-      const row = document.createElement("tr");
-      row.innerHTML = `
+  const billsTable = createTableSync(
+    "billing-body",
+    "/api/bills",
+    "No billing records yet.",
+    (bill) => `
         <td>${bill.id}</td>
         <td>${bill.patient_name} (${bill.patient_id})</td>
         <td>${bill.description}</td>
         <td>${bill.amount}</td>
         <td>${bill.status}</td>
         <td>${bill.created_at}</td>
-      `;
-      body.appendChild(row);
+      `
+  );
+
+  const renderOverview = (data) => {
+    const map = {
+      "total-patients": data.patients,
+      "total-appointments": data.appointments,
+      "total-bills": data.bills,
+      "total-unpaid": data.unpaid,
+      "total-unpaid-amount": data.unpaid_amount,
+    };
+    Object.entries(map).forEach(([id, value]) => {
+      const node = document.getElementById(id);
+      if (node) {
+        node.textContent = value;
+      }
     });
   };
 
   const refreshOverview = async () => {
     try {
-      const data = await getJSON("/api/overview");
-      const map = {
-        "total-patients": data.patients,
-        "total-appointments": data.appointments,
-        "total-bills": data.bills,
-        "total-unpaid": data.unpaid,
-      };
-      Object.entries(map).forEach(([id, value]) => {
-        const node = document.getElementById(id);
-        if (node) {
-          node.textContent = value;
-        }
-      });
+      renderOverview(await getJSON("/api/overview"));
     } catch (error) {
       showMessage("Unable to refresh overview.", "error");
     }
@@ -154,8 +200,7 @@
 
   const refreshPatients = async () => {
     try {
-      const patients = await getJSON("/api/patients");
-      renderPatients(patients);
+      await patientsTable.sync();
     } catch (error) {
       showMessage("Unable to refresh patients.", "error");
     }
@@ -163,8 +208,7 @@
 
   const refreshAppointments = async () => {
     try {
-      const appointments = await getJSON("/api/appointments");
-      renderAppointments(appointments);
+      await appointmentsTable.sync();
     } catch (error) {
       showMessage("Unable to refresh appointments.", "error");
     }
@@ -172,33 +216,95 @@
 
   const refreshBills = async () => {
     try {
-      const bills = await getJSON("/api/bills");
-      renderBills(bills);
+      await billsTable.sync();
     } catch (error) {
       showMessage("Unable to refresh billing records.", "error");
     }
   };
 
+  const STREAM_RETRY_MS = 30000;
+
+  const liveUpdate = (streamUrl, listeners, refresh, interval) => {
+    let timer = null;
+    const startPolling = () => {
+      if (!timer) {
+        timer = setInterval(refresh, interval);
+      }
+    };
+    const stopPolling = () => {
+      clearInterval(timer);
+      timer = null;
+    };
+    const connect = () => {
+      if (!window.EventSource) {
+        startPolling();
+        return;
+      }
+      const source = new EventSource(streamUrl());
+      source.onopen = stopPolling;
+      Object.entries(listeners).forEach(([event, handler]) => {
+        source.addEventListener(event, (message) => {
+          handler(JSON.parse(message.data));
+        });
+      });
+      source.onerror = () => {
+        source.close();
+        startPolling();
+        setTimeout(connect, STREAM_RETRY_MS);
+      };
+    };
+    connect();
+  };
+
   if (page === "index") {
-    refreshOverview();
-    setInterval(refreshOverview, 5000);
+    liveUpdate(
+      () => "/api/stream?overview=1",
+      { overview: renderOverview },
+      refreshOverview,
+      5000
+    );
   }
 
   if (page === "patients") {
     wireForm("form", "/api/patients", refreshPatients);
-    refreshPatients();
-    setInterval(refreshPatients, 7000);
+    refreshPatients().then(() => {
+      liveUpdate(
+        () => `/api/stream?patients=${patientsTable.seq()}`,
+        { records: patientsTable.apply },
+        refreshPatients,
+        7000
+      );
+    });
   }
 
   if (page === "appointments") {
-    wireForm("form", "/api/appointments", refreshAppointments);
-    refreshAppointments();
-    setInterval(refreshAppointments, 7000);
+    wireForm(
+      "form",
+      "/api/appointments",
+      refreshAppointments,
+      (appointment) =>
+        `Appointment booked for ${appointment.date} at ${appointment.time}` +
+        ` (${resourceName(appointment.resource)}).`
+    );
+    refreshAppointments().then(() => {
+      liveUpdate(
+        () => `/api/stream?appointments=${appointmentsTable.seq()}`,
+        { records: appointmentsTable.apply },
+        refreshAppointments,
+        7000
+      );
+    });
   }
 
   if (page === "billing") {
     wireForm("form", "/api/bills", refreshBills);
-    refreshBills();
-    setInterval(refreshBills, 7000);
+    refreshBills().then(() => {
+      liveUpdate(
+        () => `/api/stream?bills=${billsTable.seq()}`,
+        { records: billsTable.apply },
+        refreshBills,
+        7000
+      );
+    });
   }
 })();